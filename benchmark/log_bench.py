@@ -0,0 +1,207 @@
+"""
+日志吞吐基准
+N个子进程经LoggingLogger -> MultiProcessingHandler -> QLogM写日志，父进程receive线程写出
+每个场景在单独的进程中运行，MultiM、QLogM、logging都是进程内单例
+用法：
+    python benchmark/log_bench.py
+    python benchmark/log_bench.py --case file --procs 8 --records 50000
+    python benchmark/log_bench.py --conf-extra '{"log_queue": {"policy": "drop_debug"}}'
+输出：
+    emit/s        子进程调用logger的速度
+    e2e/s         从子进程开始写到receive线程处理完最后一条的速度
+    emit p50/p99  单次调用logger的耗时，微秒
+    lag p50/p99   日志创建到receive线程处理的延迟，毫秒
+    bytes         写出的字节数
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+Cases = ("console", "file", "disabled")
+_ResultMark = "LOG_BENCH_RESULT "
+_Msg = "bench"
+# 每隔多少条记录一次耗时，减少计时本身的影响
+_SampleEvery = 10
+
+
+def _percentile(data: list, p: float) -> float:
+    if not data:
+        return 0
+    data = sorted(data)
+    return data[min(int(len(data) * p), len(data) - 1)]
+
+
+class _CountStream:
+    """
+    控制台输出写到这里，只计字节数
+    """
+
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, s: str):
+        self.bytes += len(s.encode("utf-8"))
+
+    def flush(self):
+        pass
+
+
+class _LagFilter(logging.Filter):
+    """
+    挂在receive线程的sub_handler上，记录基准日志的条数和延迟
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.count = 0
+        self.lags = []
+        self.last = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.msg.startswith(_Msg):
+            self.count += 1
+            self.last = time.time()
+            if self.count % _SampleEvery == 0:
+                self.lags.append(self.last - record.created)
+        return True
+
+
+def _log_conf(case: str, tmp: str) -> list:
+    if case == "console":
+        return [{"writer": "console", "level": "info"}]
+    return [{"writer": "file", "level": "info",
+             "writer_config": {"filename": "bench.log", "log_path": os.path.join(tmp, "log")}}]
+
+
+def _produce(case: str, records: int, tmp: str):
+    from common_tool.log import logger
+    emit = logger.debug if case == "disabled" else logger.info
+    lats = []
+    start = time.time()
+    for i in range(records):
+        if i % _SampleEvery == 0:
+            t = time.perf_counter()
+            emit("%s %d %s", _Msg, i, "payload")
+            lats.append(time.perf_counter() - t)
+        else:
+            emit("%s %d %s", _Msg, i, "payload")
+    end = time.time()
+    with open(os.path.join(tmp, f"result-{os.getpid()}.json"), "w") as f:
+        json.dump({"start": start, "end": end, "lats": lats}, f)
+
+
+def _stop_when_done(lag: _LagFilter, expect: int, procs: int, tmp: str, timeout: float):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if len(glob.glob(os.path.join(tmp, "result-*.json"))) == procs and lag.count >= expect:
+            break
+        time.sleep(0.05)
+    time.sleep(0.2)
+    os.kill(os.getpid(), signal.SIGINT)
+
+
+def run_case(case: str, procs: int, records: int, conf_extra: dict, timeout: float) -> dict:
+    import yaml
+    from common_tool.server import init_base, MultiM
+    from common_tool.log import log
+
+    tmp = tempfile.mkdtemp(prefix="log_bench_")
+    os.makedirs(os.path.join(tmp, "log"))
+    conf_path = os.path.join(tmp, "conf.yaml")
+    with open(conf_path, "w") as f:
+        yaml.safe_dump({"log": _log_conf(case, tmp), **conf_extra}, f)
+    init_base(conf_path)
+
+    sub_handlers = log._Logger.logger.handlers[0].sub_handlers
+    stream = _CountStream()
+    for handler in sub_handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setStream(stream)
+    lag = _LagFilter()
+    sub_handlers[0].addFilter(lag)
+
+    for i in range(procs):
+        MultiM.add_once_p(f"bench-{i}", _produce, case, records, tmp)
+    expect = 0 if case == "disabled" else procs * records
+    t = Thread(target=_stop_when_done, args=(lag, expect, procs, tmp, timeout), daemon=True)
+    t.start()
+    MultiM.start()
+
+    results = []
+    for path in glob.glob(os.path.join(tmp, "result-*.json")):
+        with open(path) as f:
+            results.append(json.load(f))
+    start = min(r["start"] for r in results)
+    end = max(r["end"] for r in results)
+    lats = [lat for r in results for lat in r["lats"]]
+    total = procs * records
+    written = stream.bytes + sum(os.path.getsize(path) for path in glob.glob(os.path.join(tmp, "log", "*")))
+    shutil.rmtree(tmp, ignore_errors=True)
+    return {
+        "case": case,
+        "procs": procs,
+        "records": total,
+        "received": lag.count,
+        "emit/s": round(total / (end - start)),
+        "e2e/s": round(lag.count / (lag.last - start)) if lag.count else 0,
+        "emit_p50_us": round(_percentile(lats, 0.5) * 1e6, 1),
+        "emit_p99_us": round(_percentile(lats, 0.99) * 1e6, 1),
+        "lag_p50_ms": round(_percentile(lag.lags, 0.5) * 1e3, 2),
+        "lag_p99_ms": round(_percentile(lag.lags, 0.99) * 1e3, 2),
+        "bytes": written,
+    }
+
+
+def _print_table(results: list):
+    columns = ["case", "procs", "records", "received", "emit/s", "e2e/s",
+               "emit_p50_us", "emit_p99_us", "lag_p50_ms", "lag_p99_ms", "bytes"]
+    widths = [max(len(c), *(len(str(r[c])) for r in results)) for c in columns]
+    print("  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in results:
+        print("  ".join(str(r[c]).rjust(w) for c, w in zip(columns, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="logging throughput benchmark")
+    parser.add_argument("--case", choices=Cases, action="append", help="default all cases")
+    parser.add_argument("--procs", type=int, default=4, help="producer processes")
+    parser.add_argument("--records", type=int, default=20000, help="records per process")
+    parser.add_argument("--conf-extra", default="{}", help="json merged into the config, e.g. log_queue")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        r = run_case(args.case[0], args.procs, args.records, json.loads(args.conf_extra), args.timeout)
+        print(_ResultMark + json.dumps(r))
+        return
+
+    results = []
+    for case in args.case or Cases:
+        cmd = [sys.executable, os.path.abspath(__file__), "--single", "--case", case,
+               "--procs", str(args.procs), "--records", str(args.records),
+               "--conf-extra", args.conf_extra, "--timeout", str(args.timeout)]
+        out = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+        for line in out.splitlines():
+            if line.startswith(_ResultMark):
+                results.append(json.loads(line[len(_ResultMark):]))
+                break
+        else:
+            print(f"{case} failed:\n{out}")
+    if results:
+        _print_table(results)
+
+
+if __name__ == "__main__":
+    main()
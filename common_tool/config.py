@@ -121,6 +121,14 @@ def log_conf() -> list[dict]:
     return get_global_config().get("log", [])
 
 
+def log_queue_conf() -> dict:
+    """
+    获取日志队列配置
+    :return:
+    """
+    return get_global_config().get("log_queue", {})
+
+
 def user_service_name() -> str:
     return "user"
 
@@ -1,4 +1,6 @@
-from .cache import Cache, CacheKey
+from .cache import Cache, CacheKey, CacheItem, AsyncCacheKey, SharedCacheKey
+from .stats import CacheStats
+from .memo import cached
 from .asr import Content, Sentence, Time, VoiceAsrData
 from .data import *
 from .url import *
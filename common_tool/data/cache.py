@@ -1,18 +1,58 @@
+import asyncio
+import copy
+import heapq
+import os
+import pickle
+import sys
 from abc import ABC, abstractmethod
+from queue import SimpleQueue
+from time import time, perf_counter
 from typing import Any
-from threading import Lock
+from threading import Lock, Event, Thread
 
+from .disk import DiskTier
+from .evict import Policies
+from .stats import CacheStats
+
+
+class CacheItem:
+    """
+    _load返回本类时，按ttl单独设置该key的过期时间，覆盖CacheKey的默认ttl
+    """
+
+    __slots__ = ("value", "ttl")
+
+    def __init__(self, value, ttl: float):
+        self.value = value
+        self.ttl = ttl
+
+
+# 负缓存占位，_load返回None时缓存，避免不存在的key反复加载
+_Miss = object()
+
+
+_CachePrivate = ("_lock", "_stats", "_view", "_reload_lock", "_reload_stop", "_reload_interval", "_reloader_pid")
 
-# TODO: 增加时间淘汰
 
 class Cache(ABC):
     """
     大多数基础类型赋值操作都是线程安全的，本类主要是为了防止并发重复加载
+    reload在副本上执行_load，完成后整体替换，读取方不阻塞，也不会读到加载了一半的数据
     """
 
-    def __init__(self):
+    def __init__(self, stats: bool = False, reload_interval: float = 0):
+        """
+        :param stats: 是否统计命中、加载耗时，见stats()
+        :param reload_interval: 后台定期reload的间隔秒数，0不定期reload
+        """
         self._lock = Lock()
         self._inited = False
+        self._stats = CacheStats() if stats else None
+        self._view = self  # get读取的数据对象，reload后替换为新副本
+        self._reload_interval = reload_interval
+        self._reload_lock = Lock()  # 同时只有一个reload
+        self._reload_stop = Event()
+        self._reloader_pid = 0
 
     @abstractmethod
     def _load(self):
@@ -23,7 +63,19 @@ class Cache(ABC):
         pass
 
     def _get(self, key: str):
-        return getattr(self, key, None)
+        return getattr(self._view, key, None)
+
+    def _timed_load(self, obj):
+        if self._stats is None:
+            obj._load()
+            return
+        start = perf_counter()
+        ok = False
+        try:
+            obj._load()
+            ok = True
+        finally:
+            self._stats.load(perf_counter() - start, ok)
 
     def _init_data(self):
         if self._inited:
@@ -31,17 +83,84 @@ class Cache(ABC):
         with self._lock:
             if self._inited:
                 return
-            self._load()
+            self._timed_load(self)
             self._print()
             self._inited = True
 
+    def reload(self) -> bool:
+        """
+        在副本上重新加载，完成后替换，加载期间get返回旧数据
+        _load需设置全部数据项，旧数据项不会自动删除
+        :return: 已有reload在执行或加载失败时返回False
+        """
+        if not self._reload_lock.acquire(False):
+            return False
+        try:
+            shadow = copy.copy(self)
+            del shadow._view
+            try:
+                self._timed_load(shadow)
+            except Exception as e:  # pylint: disable=broad-except
+                from common_tool.log import logger
+                logger.error(f"{self.__class__.__name__} reload err={e}, keep old data")
+                return False
+            self._view = shadow
+            # 子类中直接访问属性的也能读到新数据
+            self.__dict__.update({k: v for k, v in shadow.__dict__.items() if not k.startswith("_")})
+            self._inited = True
+            shadow._print()
+            return True
+        finally:
+            self._reload_lock.release()
+
+    def _reload_loop(self):
+        while not self._reload_stop.wait(self._reload_interval):
+            self.reload()
+
+    def _start_reloader(self):
+        if not self._reload_interval or self._reloader_pid == os.getpid():
+            return
+        with self._lock:
+            if self._reloader_pid == os.getpid():
+                return
+            self._reloader_pid = os.getpid()
+            self._reload_stop.clear()
+            t = Thread(target=self._reload_loop, name=f"{self.__class__.__name__}-reloader")
+            t.daemon = True
+            t.start()
+
+    def close(self):
+        """
+        停止定期reload
+        """
+        self._reload_stop.set()
+
     def get(self, key: str):
         self._init_data()
-        return self._get(key)
+        self._start_reloader()
+        r = self._get(key)
+        if self._stats is not None:
+            if r is None:
+                self._stats.miss()
+            else:
+                self._stats.hit()
+        return r
+
+    def stats(self) -> dict:
+        """
+        统计数据，size为已加载的数据项数
+        """
+        result = self._stats.dict() if self._stats is not None else {}
+        result["size"] = len([k for k in self._view.__dict__ if not k.startswith("_")])
+        return result
+
+    def log_stats(self):
+        from common_tool.log import logger
+        logger.info(f"{self.__class__.__name__} stats {self.stats()}")
 
     def __str__(self) -> str:
         _d = self.__dict__
-        return {k: v for k, v in _d.items() if k != "_lock"}.__str__()
+        return {k: v for k, v in _d.items() if k not in _CachePrivate}.__str__()
 
     def _print(self):
         from common_tool.system import cur_pid, cur_tid
@@ -52,71 +171,723 @@ class Cache(ABC):
 
 class CacheKey(ABC):
     """
-    本类在key加载时加锁，保证每条key数据的一致性
+    同一key同时只有一个线程加载，其余线程等待加载完成，保证每条key数据的一致性
     """
 
-    def __init__(self):
-        self._lock = Lock()  # 对_key_lock和_cache_data操作时加锁
-        self._key_lock: dict[str, Lock] = {}  # 单key加载时加锁
+    def __init__(self, ttl: float = 0, sweep_interval: float = 0,
+                 max_size: int = 0, max_bytes: int = 0, policy: str = "lru",
+                 negative_ttl: float = 0, refresh_ahead: float = 0, stale_ttl: float = 0,
+                 lock_stripes: int = 64, stats: bool = False, disk_path: str = "",
+                 bus: str = ""):
+        """
+        :param ttl: 默认过期秒数，0不过期；_load可返回CacheItem单独指定
+        :param sweep_interval: 后台清理过期key的间隔秒数，0不启动清理线程，仅在get时惰性检查
+        :param max_size: 最多缓存key数，0不限制
+        :param max_bytes: 最多缓存的估算字节数，见_sizeof，0不限制
+        :param policy: 超出限制时的淘汰策略，lru/lfu
+        :param negative_ttl: _load返回None时，缓存"不存在"的秒数，0不缓存
+        :param refresh_ahead: 距过期不足该秒数时，get仍返回旧数据，由后台线程重新加载
+        :param stale_ttl: 过期后仍可返回旧数据的秒数，期间由后台线程重新加载；
+            refresh_ahead或stale_ttl不为0时，update也改为后台重新加载
+        :param lock_stripes: 加载表的分段数，向上取2的幂，每段一把互斥锁和本段正在加载的key；
+            只为正在加载的key分配Event，加载完成即删除；0则不分段，所有key共用一把互斥锁
+        :param stats: 是否统计命中、加载耗时、淘汰，见stats()
+        :param disk_path: 磁盘二级缓存的sqlite文件，_load前先查磁盘，ttl一并持久化；空则不启用
+        :param bus: BusM注册的名字，update/del_key广播到所有进程；每个进程一个bus只能有一个CacheKey
+        """
+        self._lock = Lock()  # 对_cache_data操作时加锁
+        # 分段的(互斥锁, 正在加载的key到完成事件)，互斥锁只在登记、删除时持有，加载时不持有，
+        # _load中get其他key不会跨线程死锁
+        n = 1 << (lock_stripes - 1).bit_length() if lock_stripes > 1 else 1
+        self._stripes: list[tuple[Lock, dict[str, Event]]] = [(Lock(), {}) for _ in range(n)]
+        self._stripe_mask = n - 1
         self._cache_data: dict[str, Any] = {}
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._expire_at: dict[str, float] = {}  # 仅记录有过期时间的key
 
-    def _get_lock(self, key: str) -> Lock:
-        lock = self._key_lock.get(key)
-        if lock:
-            return lock
-        with self._lock:
-            lock = self._key_lock.get(key)
-            if lock:
-                return lock
-            lock = Lock()
-            self._key_lock[key] = lock
-            return lock
+        self._sweep_interval = sweep_interval
+        self._sweep_heap: list[tuple[float, str]] = []  # 清理线程按过期时间取key
+        self._sweep_stop = Event()
+        self._sweeper_pid = 0  # fork后子进程需重新启动清理线程
+
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._bytes = 0
+        self._key_bytes: dict[str, int] = {}
+        self._refresh_ahead = refresh_ahead
+        self._stale_ttl = stale_ttl
+        self._refresh = bool(refresh_ahead or stale_ttl)
+        self._refresh_at: dict[str, float] = {}  # 到期后get触发后台加载
+        self._refreshing: set[str] = set()
+        self._refresh_q: SimpleQueue = SimpleQueue()
+        self._refresher_pid = 0
+
+        self._stats = CacheStats() if stats else None
+        self._disk = DiskTier(disk_path) if disk_path else None
+        self._bus_name = bus
+        self._bus = None  # 第一次get时从BusM获取，此时子进程已init_sync
+        self._bus_seq = 0
+
+        self._policy = None
+        if max_size or max_bytes:
+            if policy not in Policies:
+                raise ValueError(f"CacheKey policy {policy} invalid, optional {list(Policies.keys())}")
+            self._policy = Policies[policy]()
+
+    def _begin(self, key: str):
+        """
+        登记本线程加载key
+        :return: 其他线程正在加载时返回其完成事件，未登记；否则None，加载后需调用_end
+        """
+        mutex, loading = self._stripes[hash(key) & self._stripe_mask]
+        with mutex:
+            event = loading.get(key)
+            if event is None:
+                loading[key] = Event()
+            return event
+
+    def _end(self, key: str):
+        mutex, loading = self._stripes[hash(key) & self._stripe_mask]
+        with mutex:
+            event = loading.pop(key)
+        event.set()
+
+    def _expired(self, key: str, now: float = None) -> bool:
+        expire_at = self._expire_at.get(key)
+        if expire_at is None:
+            return False
+        return expire_at <= (now or time())
 
     def _key_inited(self, key: str):
-        return key in self._cache_data
+        return key in self._cache_data and not self._expired(key)
 
     @abstractmethod
     def _load(self, key: str):
         """
         key没有缓存时，加载数据项
-        :return:
+        :return: 数据项，或CacheItem指定该key的ttl；None不存在，按negative_ttl缓存
         """
         pass
 
+    def _load_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        get_many时批量加载未缓存的key，可重载为一次后端请求
+        :param keys: 未缓存的key
+        :return: key到数据项的映射，缺少的key视为None
+        """
+        return {key: self._load(key) for key in keys}
+
+    def _sizeof(self, key: str, value) -> int:
+        """
+        估算单条缓存占用的字节数，仅计算浅层大小，容器类数据可重载
+        """
+        return sys.getsizeof(key) + sys.getsizeof(value)
+
+    def _pop(self, key: str):
+        # 调用方持有self._lock
+        self._cache_data.pop(key, None)
+        self._expire_at.pop(key, None)
+        self._refresh_at.pop(key, None)
+        if self._policy is None:
+            return
+        self._policy.remove(key)
+        self._bytes -= self._key_bytes.pop(key, 0)
+
+    def _over_limit(self, size: int) -> bool:
+        if self._max_size and len(self._cache_data) >= self._max_size:
+            return True
+        return self._max_bytes and self._bytes + size > self._max_bytes
+
+    def _evict(self, size: int):
+        """
+        写入新key前淘汰，直到能放下size字节的新key
+        调用方持有self._lock
+        """
+        while self._over_limit(size):
+            key = self._policy.victim()
+            if key is None:
+                return
+            self._pop(key)
+            if self._stats is not None:
+                self._stats.evict()
+
     def _del(self, key: str):
         # 防止并发删除异常
-        if not self._key_inited(key):
+        if key not in self._cache_data:
             return
         with self._lock:
-            if not self._key_inited(key):
+            if key not in self._cache_data:
                 return
-            del self._cache_data[key]
+            self._pop(key)
+
+    def _set(self, key: str, r) -> float:
+        """
+        :return: 过期时间戳，不含stale_ttl，0不过期
+        """
+        ttl = self._ttl
+        if isinstance(r, CacheItem):
+            ttl = r.ttl
+            r = r.value
+        with self._lock:
+            if self._policy is not None:
+                self._pop(key)
+                size = self._sizeof(key, r) if self._max_bytes else 0
+                self._evict(size)
+                self._policy.add(key)
+                self._bytes += size
+                self._key_bytes[key] = size
+            self._cache_data[key] = r
+            if not ttl:
+                self._expire_at.pop(key, None)
+                self._refresh_at.pop(key, None)
+                return 0
+            expire_at = time() + ttl
+            hard_expire_at = expire_at
+            if self._refresh and r is not _Miss:
+                self._refresh_at[key] = expire_at - self._refresh_ahead
+                hard_expire_at += self._stale_ttl
+            self._expire_at[key] = hard_expire_at
+            if self._sweep_interval:
+                heapq.heappush(self._sweep_heap, (hard_expire_at, key))
+            return expire_at
 
     def _get(self, key: str):
         # 基础类型保证thread-safe
-        return self._cache_data.get(key, None)
+        if self._expired(key):
+            self._del(key)
+            if self._stats is not None:
+                self._stats.expire()
+            return None
+        if self._policy is not None:
+            with self._lock:
+                self._policy.touch(key)
+        if self._refresh:
+            refresh_at = self._refresh_at.get(key)
+            if refresh_at is not None and refresh_at <= time():
+                self._schedule_refresh(key)
+        r = self._cache_data.get(key, None)
+        if r is _Miss:
+            return None
+        return r
+
+    def _hit(self, key: str):
+        # 调用方判断self._stats不为None
+        self._stats.hit(self._cache_data.get(key) is _Miss)
+
+    def _timed(self, func, *args):
+        if self._stats is None:
+            return func(*args)
+        start = perf_counter()
+        ok = False
+        try:
+            r = func(*args)
+            ok = True
+            return r
+        finally:
+            self._stats.load(perf_counter() - start, ok)
 
     def _init_data(self, key: str):
-        if self._key_inited(key):
-            return
-        with self._get_lock(key):
+        while True:
             if self._key_inited(key):
+                if self._stats is not None:
+                    self._hit(key)
                 return
-            r = self._load(key)
-            if r is None:
+            event = self._begin(key)
+            if event is None:
+                break
+            # 等其他线程加载完成后重新检查，加载失败或未缓存None时由本线程加载
+            event.wait()
+        try:
+            if self._key_inited(key):
+                if self._stats is not None:
+                    self._hit(key)
                 return
-            self._cache_data[key] = r
+            if self._stats is not None:
+                self._stats.miss()
+            if self._load_disk([key]):
+                return
+            self._store(key, self._timed(self._load, key))
+        finally:
+            self._end(key)
+
+    def _store(self, key: str, r):
+        self._store_many({key: r})
+
+    def _store_many(self, result: dict[str, Any]):
+        rows = []
+        for key, r in result.items():
+            if r is None:
+                if self._negative_ttl:
+                    self._set(key, CacheItem(_Miss, self._negative_ttl))
+                continue
+            expire_at = self._set(key, r)
+            if self._disk is not None:
+                rows.append((key, r.value if isinstance(r, CacheItem) else r, expire_at))
+        if rows:
+            self._disk.set_many(rows)
+
+    def _load_disk(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """
+        从磁盘二级缓存加载到内存，保留原过期时间
+        :return: 磁盘中找到的key
+        """
+        if self._disk is None:
+            return {}
+        found = self._disk.get_many(keys)
+        now = time()
+        for key, (value, expire_at) in found.items():
+            self._set(key, CacheItem(value, expire_at - now if expire_at else 0))
+        if self._stats is not None:
+            self._stats.disk_hits += len(found)
+        return found
+
+    def _init_many(self, keys: list[str]):
+        # 只加载没有其他线程在加载的key，正在被其他线程加载的key之后逐个等待
+        begun = []
+        loading = []
+        waiting = []
+        for key in keys:
+            if self._key_inited(key):
+                if self._stats is not None:
+                    self._hit(key)
+                continue
+            if self._begin(key) is not None:
+                waiting.append(key)
+                continue
+            begun.append(key)
+            if self._key_inited(key):
+                if self._stats is not None:
+                    self._hit(key)
+                continue
+            loading.append(key)
+
+        try:
+            if loading:
+                if self._stats is not None:
+                    self._stats.misses += len(loading)
+                found = self._load_disk(loading)
+                loading = [key for key in loading if key not in found]
+            if loading:
+                result = self._timed(self._load_many, loading)
+                self._store_many({key: result.get(key) for key in loading})
+        finally:
+            for key in begun:
+                self._end(key)
+
+        for key in waiting:
+            self._init_data(key)
 
     def get(self, key: str):
+        self._start_sweeper()
+        if self._bus_name:
+            self._poll_bus()
         self._init_data(key)
         return self._get(key)
 
+    def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        批量获取，未缓存的key合并为一次_load_many
+        :param keys:
+        :return: key到数据项的映射，不存在的为None
+        """
+        self._start_sweeper()
+        if self._bus_name:
+            self._poll_bus()
+        keys = list(dict.fromkeys(keys))
+        self._init_many(keys)
+        return {key: self._get(key) for key in keys}
+
+    def _get_bus(self):
+        if self._bus is None:
+            from common_tool.server import BusM
+            self._bus = BusM.get(self._bus_name)
+            if self._bus is None:
+                from common_tool.log import logger
+                logger.error(f"{self.__class__.__name__} no bus {self._bus_name}, register by BusM first")
+                self._bus_name = ""
+                return None
+            self._bus_seq = self._bus.seq()
+        return self._bus
+
+    def _poll_bus(self):
+        bus = self._get_bus()
+        if bus is None or bus.seq() == self._bus_seq:
+            return
+        self._bus_seq, keys = bus.poll(self._bus_seq)
+        if keys is None:
+            self.clear()
+            return
+        for key in keys:
+            self._invalidate(key)
+
+    def _publish(self, key):
+        if not self._bus_name:
+            return
+        bus = self._get_bus()
+        if bus is not None:
+            bus.publish(key)
+
+    def _invalidate(self, key: str):
+        # 其他进程广播的失效，磁盘缓存已由发布方处理
+        if self._refresh and self._key_inited(key):
+            self._schedule_refresh(key)
+            return
+        self._del(key)
+
+    def clear(self):
+        """
+        清空本进程的缓存
+        """
+        with self._lock:
+            for key in list(self._cache_data.keys()):
+                self._pop(key)
+            self._sweep_heap.clear()
+
     def del_key(self, key: str):
-        return self._del(key)
+        if self._disk is not None:
+            self._disk.delete(key)
+        self._del(key)
+        self._publish(key)
 
     def update(self, key: str, info=None):
         """
         更新仅删除，交由get重新加载数据
+        开启refresh_ahead/stale_ttl时，保留旧数据并后台重新加载
+        :param key:
+        :param info:
+        :return:
+        """
+        if self._refresh and self._key_inited(key):
+            self._schedule_refresh(key)
+            self._publish(key)
+            return
+        return self.del_key(key)
+
+    def _schedule_refresh(self, key: str):
+        if key in self._refreshing:
+            return
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        self._start_refresher()
+        self._refresh_q.put(key)
+
+    def _refresh_key(self, key: str):
+        try:
+            # 其他线程正在加载该key时，由其写入新数据
+            if self._begin(key) is not None:
+                return
+            try:
+                r = self._timed(self._load, key)
+                if r is None:
+                    self._del(key)
+                self._store(key, r)
+            finally:
+                self._end(key)
+        finally:
+            self._refreshing.discard(key)
+
+    def _refresh_loop(self):
+        while True:
+            key = self._refresh_q.get()
+            try:
+                self._refresh_key(key)
+            except Exception as e:  # pylint: disable=broad-except
+                # 加载失败保留旧数据，下次get再触发
+                from common_tool.log import logger
+                logger.error(f"{self.__class__.__name__} refresh {key} err={e}")
+
+    def _start_refresher(self):
+        if self._refresher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._refresher_pid == os.getpid():
+                return
+            self._refresher_pid = os.getpid()
+            t = Thread(target=self._refresh_loop, name=f"{self.__class__.__name__}-refresher")
+            t.daemon = True
+            t.start()
+
+    def __len__(self):
+        return len(self._cache_data)
+
+    def sweep(self) -> int:
+        """
+        清理已过期的key
+        :return: 清理数量
+        """
+        now = time()
+        count = 0
+        with self._lock:
+            while self._sweep_heap and self._sweep_heap[0][0] <= now:
+                expire_at, key = heapq.heappop(self._sweep_heap)
+                # 重新加载过的key，堆中的旧记录直接丢弃
+                if self._expire_at.get(key) != expire_at:
+                    continue
+                self._pop(key)
+                count += 1
+        if count and self._stats is not None:
+            self._stats.expire(count)
+        if self._disk is not None:
+            self._disk.purge()
+        return count
+
+    def stats(self) -> dict:
+        """
+        统计数据，未开启stats时只有size
+        """
+        result = self._stats.dict() if self._stats is not None else {}
+        result["size"] = len(self._cache_data)
+        if self._max_bytes:
+            result["bytes"] = self._bytes
+        return result
+
+    def log_stats(self):
+        from common_tool.log import logger
+        logger.info(f"{self.__class__.__name__} stats {self.stats()}")
+
+    def _sweep_loop(self):
+        while not self._sweep_stop.wait(self._sweep_interval):
+            try:
+                self.sweep()
+            except Exception as e:  # pylint: disable=broad-except
+                from common_tool.log import logger
+                logger.error(f"{self.__class__.__name__} sweep err={e}")
+
+    def _start_sweeper(self):
+        if not self._sweep_interval or self._sweeper_pid == os.getpid():
+            return
+        with self._lock:
+            if self._sweeper_pid == os.getpid():
+                return
+            self._sweeper_pid = os.getpid()
+            self._sweep_stop.clear()
+            t = Thread(target=self._sweep_loop, name=f"{self.__class__.__name__}-sweeper")
+            t.daemon = True
+            t.start()
+
+    def close(self):
+        """
+        停止清理线程
+        """
+        self._sweep_stop.set()
+
+
+class AsyncCacheKey(CacheKey):
+    """
+    协程版CacheKey，过期、淘汰与CacheKey一致
+    同一key并发get时只有一个_load在执行，其余协程等待同一个future
+    只能在一个事件循环内使用
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._loading: dict[str, asyncio.Future] = {}
+
+    @abstractmethod
+    async def _load(self, key: str):
+        """
+        key没有缓存时，加载数据项
+        :return: 数据项，或CacheItem指定该key的ttl；None不存在，按negative_ttl缓存
+        """
+        pass
+
+    async def _load_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        get_many时批量加载未缓存的key，可重载为一次后端请求
+        :param keys: 未缓存的key
+        :return: key到数据项的映射，缺少的key视为None
+        """
+        result = await asyncio.gather(*[self._load(key) for key in keys])
+        return dict(zip(keys, result))
+
+    async def _timed_async(self, coro):
+        if self._stats is None:
+            return await coro
+        start = perf_counter()
+        ok = False
+        try:
+            r = await coro
+            ok = True
+            return r
+        finally:
+            self._stats.load(perf_counter() - start, ok)
+
+    async def _load_one(self, key: str):
+        if self._load_disk([key]):
+            return
+        self._store(key, await self._timed_async(self._load(key)))
+
+    async def _refresh_one(self, key: str):
+        try:
+            r = await self._timed_async(self._load(key))
+            if r is None:
+                self._del(key)
+            self._store(key, r)
+        finally:
+            self._refreshing.discard(key)
+
+    def _schedule_refresh(self, key: str):
+        # 在当前事件循环后台加载，不启动线程
+        if key in self._refreshing or key in self._loading:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中（同步代码、其他线程），无法后台加载，删除后由下次get重新加载
+            if self._disk is not None:
+                self._disk.delete(key)
+            self._del(key)
+            return
+        self._refreshing.add(key)
+        try:
+            self._flight([key], self._refresh_one(key))
+        except BaseException:
+            self._refreshing.discard(key)
+            raise
+
+    async def _load_batch(self, keys: list[str]):
+        found = self._load_disk(keys)
+        keys = [key for key in keys if key not in found]
+        if not keys:
+            return
+        result = await self._timed_async(self._load_many(keys))
+        self._store_many({key: result.get(key) for key in keys})
+
+    def _flight(self, keys: list[str], coro) -> asyncio.Future:
+        # 加载放到单独的task，某个等待方被取消时不影响其他等待方
+        fut = asyncio.ensure_future(coro)
+        for key in keys:
+            self._loading[key] = fut
+
+        def _done(f):
+            for k in keys:
+                if self._loading.get(k) is f:
+                    del self._loading[k]
+            # 等待方都被取消时，避免异常未取出的告警
+            if not f.cancelled():
+                f.exception()
+
+        fut.add_done_callback(_done)
+        return fut
+
+    async def _init_data(self, key: str):
+        if self._key_inited(key):
+            if self._stats is not None:
+                self._hit(key)
+            return
+        fut = self._loading.get(key)
+        if fut is None:
+            if self._stats is not None:
+                self._stats.miss()
+            fut = self._flight([key], self._load_one(key))
+        elif self._stats is not None:
+            # 与CacheKey一致，等待其他协程加载的计为命中
+            self._stats.hit()
+        await asyncio.shield(fut)
+
+    async def _init_many(self, keys: list[str]):
+        futs = []
+        loading = []
+        for key in keys:
+            if self._key_inited(key):
+                if self._stats is not None:
+                    self._hit(key)
+                continue
+            fut = self._loading.get(key)
+            if fut is None:
+                loading.append(key)
+            elif fut not in futs:
+                futs.append(fut)
+        if loading:
+            if self._stats is not None:
+                self._stats.misses += len(loading)
+            futs.append(self._flight(loading, self._load_batch(loading)))
+        if futs:
+            await asyncio.shield(asyncio.gather(*futs))
+
+    async def get(self, key: str):
+        self._start_sweeper()
+        if self._bus_name:
+            self._poll_bus()
+        await self._init_data(key)
+        return self._get(key)
+
+    async def get_many(self, keys: list[str]) -> dict[str, Any]:
+        """
+        批量获取，未缓存的key合并为一次_load_many
+        :param keys:
+        :return: key到数据项的映射，不存在的为None
+        """
+        self._start_sweeper()
+        if self._bus_name:
+            self._poll_bus()
+        keys = list(dict.fromkeys(keys))
+        await self._init_many(keys)
+        return {key: self._get(key) for key in keys}
+
+
+class SharedCacheKey(ABC):
+    """
+    MultiM多进程共享的CacheKey，数据存放在ShmM注册的共享内存表中
+    一个进程加载后，其他进程直接读取，同一key跨进程只加载一次
+    加载时持有跨进程加载锁，_load中可get其他key；进程间加载互相依赖或持锁进程中途退出时，
+    等待超时后不加锁加载，该key可能重复加载，见ShmTable.load_lock
+    数据需可pickle
+    """
+
+    def __init__(self, name: str, ttl: float = 0):
+        """
+        :param name: ShmM.register注册的名字
+        :param ttl: 默认过期秒数，0不过期；_load可返回CacheItem单独指定
+        """
+        self._name = name
+        self._ttl = ttl
+
+    def _table(self):
+        from common_tool.server import ShmM
+        return ShmM.get(self._name)
+
+    @abstractmethod
+    def _load(self, key: str):
+        """
+        key没有缓存时，加载数据项
+        :return: 数据项，或CacheItem指定该key的ttl；None不缓存
+        """
+        pass
+
+    def _set(self, table, key: str, r):
+        ttl = self._ttl
+        if isinstance(r, CacheItem):
+            ttl = r.ttl
+            r = r.value
+        if not table.set(key, pickle.dumps(r, pickle.HIGHEST_PROTOCOL), time() + ttl if ttl else 0):
+            from common_tool.log import logger
+            logger.error(f"{self.__class__.__name__} {key} too large for {self._name} or table write lock timeout")
+        return r
+
+    def get(self, key: str):
+        table = self._table()
+        b = table.get(key)
+        if b is not None:
+            return pickle.loads(b)
+        with table.load_lock(key):
+            b = table.get(key)
+            if b is not None:
+                return pickle.loads(b)
+            r = self._load(key)
+            if r is None:
+                return None
+            return self._set(table, key, r)
+
+    def del_key(self, key: str):
+        self._table().delete(key)
+
+    def update(self, key: str, info=None):
+        """
+        更新仅删除，交由get重新加载数据，所有进程生效
         :param key:
         :param info:
         :return:
@@ -0,0 +1,125 @@
+import os
+import pickle
+import sqlite3
+import threading
+from time import time
+from typing import Any, Optional
+
+from common_tool.log import logger
+
+_Table = "cache"
+
+
+class DiskTier:
+    """
+    CacheKey的磁盘二级缓存，基于sqlite，进程重启后可直接从本地磁盘恢复
+    每个线程、每个进程单独连接；WAL模式下多个进程可共用同一文件
+    value需可pickle
+    """
+
+    def __init__(self, path: str, timeout: float = 5):
+        """
+        :param path: sqlite文件路径
+        :param timeout: 多进程写入时等待锁的秒数
+        """
+        self._path = path
+        self._timeout = timeout
+        self._local = threading.local()
+        dirname = os.path.dirname(path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+
+    def _conn(self) -> sqlite3.Connection:
+        # fork后不能复用父进程的连接
+        if getattr(self._local, "pid", 0) == os.getpid():
+            return self._local.conn
+        conn = sqlite3.connect(self._path, timeout=self._timeout, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {_Table} "
+                     f"(key TEXT PRIMARY KEY, value BLOB NOT NULL, expire_at REAL NOT NULL)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {_Table}_expire_at ON {_Table} (expire_at)")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key: str) -> Optional[tuple[Any, float]]:
+        """
+        :return: (value, 过期时间戳，0不过期)，不存在或已过期为None
+        """
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, tuple[Any, float]]:
+        """
+        读取失败时当作不存在，不影响内存缓存
+        :return: key到(value, 过期时间戳，0不过期)的映射，不含不存在或已过期的
+        """
+        result = {}
+        now = time()
+        rows = []
+        try:
+            # sqlite单条语句的参数个数有限制
+            for i in range(0, len(keys), 500):
+                part = keys[i:i + 500]
+                rows.extend(self._conn().execute(
+                    f"SELECT key, value, expire_at FROM {_Table} WHERE key IN ({','.join('?' * len(part))})",
+                    part).fetchall())
+        except sqlite3.Error as e:
+            logger.error(f"DiskTier {self._path} get err={e}")
+        for key, value, expire_at in rows:
+            if expire_at and expire_at <= now:
+                continue
+            try:
+                result[key] = (pickle.loads(value), expire_at)
+            except Exception as e:  # pylint: disable=broad-except
+                # 部署前写入的数据，类已改名、移动等，删除后当作不存在
+                logger.error(f"DiskTier {self._path} {key} can not unpickle err={e}, delete")
+                self.delete(key)
+        return result
+
+    def set(self, key: str, value, expire_at: float = 0):
+        self.set_many([(key, value, expire_at)])
+
+    def set_many(self, items: list[tuple[str, Any, float]]):
+        """
+        :param items: (key, value, 过期时间戳，0不过期)
+        """
+        rows = []
+        for key, value, expire_at in items:
+            try:
+                rows.append((key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expire_at))
+            except (pickle.PicklingError, TypeError, AttributeError) as e:
+                logger.error(f"DiskTier {key} can not pickle err={e}")
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN")
+                conn.executemany(f"INSERT OR REPLACE INTO {_Table} (key, value, expire_at) VALUES (?, ?, ?)", rows)
+        except sqlite3.Error as e:
+            logger.error(f"DiskTier {self._path} set err={e}")
+
+    def delete(self, key: str):
+        try:
+            self._conn().execute(f"DELETE FROM {_Table} WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logger.error(f"DiskTier {self._path} delete {key} err={e}")
+
+    def purge(self) -> int:
+        """
+        删除已过期的数据
+        :return: 删除数量
+        """
+        try:
+            cur = self._conn().execute(
+                f"DELETE FROM {_Table} WHERE expire_at > 0 AND expire_at <= ?", (time(),))
+            return cur.rowcount
+        except sqlite3.Error as e:
+            logger.error(f"DiskTier {self._path} purge err={e}")
+            return 0
+
+    def close(self):
+        if getattr(self._local, "pid", 0) == os.getpid():
+            self._local.conn.close()
+            self._local.pid = 0
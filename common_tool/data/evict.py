@@ -0,0 +1,85 @@
+from collections import OrderedDict
+from typing import Optional
+
+
+class LRUPolicy:
+    """
+    最近最少使用，淘汰最久未访问的key
+    非线程安全，由调用方加锁
+    """
+
+    def __init__(self):
+        self._order: OrderedDict[str, None] = OrderedDict()
+
+    def add(self, key: str):
+        self._order[key] = None
+
+    def touch(self, key: str):
+        if key in self._order:
+            self._order.move_to_end(key)
+
+    def remove(self, key: str):
+        self._order.pop(key, None)
+
+    def victim(self) -> Optional[str]:
+        return next(iter(self._order), None)
+
+    def __len__(self):
+        return len(self._order)
+
+
+class LFUPolicy:
+    """
+    最不经常使用，淘汰访问次数最少的key，次数相同时淘汰最久未访问的
+    每个访问次数一个桶，增删改均为O(1)
+    非线程安全，由调用方加锁
+    """
+
+    def __init__(self):
+        self._freq: dict[str, int] = {}
+        self._buckets: dict[int, OrderedDict[str, None]] = {}
+        self._min_freq = 0
+
+    def _bucket_del(self, key: str, freq: int):
+        bucket = self._buckets[freq]
+        del bucket[key]
+        if not bucket:
+            del self._buckets[freq]
+
+    def add(self, key: str):
+        self._freq[key] = 1
+        self._buckets.setdefault(1, OrderedDict())[key] = None
+        self._min_freq = 1
+
+    def touch(self, key: str):
+        freq = self._freq.get(key)
+        if freq is None:
+            return
+        self._bucket_del(key, freq)
+        if self._min_freq == freq and freq not in self._buckets:
+            self._min_freq = freq + 1
+        self._freq[key] = freq + 1
+        self._buckets.setdefault(freq + 1, OrderedDict())[key] = None
+
+    def remove(self, key: str):
+        freq = self._freq.pop(key, None)
+        if freq is None:
+            return
+        self._bucket_del(key, freq)
+
+    def victim(self) -> Optional[str]:
+        if not self._freq:
+            return None
+        if self._min_freq not in self._buckets:
+            # 仅在remove清空了最小桶后发生
+            self._min_freq = min(self._buckets)
+        return next(iter(self._buckets[self._min_freq]))
+
+    def __len__(self):
+        return len(self._freq)
+
+
+Policies = {
+    "lru": LRUPolicy,
+    "lfu": LFUPolicy,
+}
@@ -0,0 +1,108 @@
+import inspect
+from functools import wraps
+
+from .cache import CacheKey, AsyncCacheKey
+
+# 区分位置参数和关键字参数
+_KwdMark = (object(),)
+# 函数返回None时缓存的占位，CacheKey不缓存None
+_Null = object()
+# 单个参数时直接作为key的类型
+_FastTypes = {int, str}
+
+
+class _HashedKey(list):
+    """
+    参数元组作为key，只计算一次hash，参考functools._HashedSeq
+    """
+
+    __slots__ = ("hashvalue", "args", "kwargs")
+
+    def __init__(self, tup: tuple, args: tuple, kwargs: dict):
+        super().__init__(tup)
+        self.hashvalue = hash(tup)
+        self.args = args
+        self.kwargs = kwargs
+
+    def __hash__(self):
+        return self.hashvalue
+
+
+def _make_key(args: tuple, kwargs: dict):
+    if not kwargs and len(args) == 1 and type(args[0]) in _FastTypes:
+        return args[0]
+    key = args
+    if kwargs:
+        key += _KwdMark
+        for item in kwargs.items():
+            key += item
+    return _HashedKey(key, args, kwargs)
+
+
+def _call_args(key) -> tuple[tuple, dict]:
+    if isinstance(key, _HashedKey):
+        return key.args, key.kwargs
+    return (key,), {}
+
+
+class _FuncCache(CacheKey):
+    def __init__(self, func, **kwargs):
+        super().__init__(**kwargs)
+        self._func = func
+
+    def _load(self, key):
+        args, kwargs = _call_args(key)
+        r = self._func(*args, **kwargs)
+        return _Null if r is None else r
+
+
+class _AsyncFuncCache(AsyncCacheKey):
+    def __init__(self, func, **kwargs):
+        super().__init__(**kwargs)
+        self._func = func
+
+    async def _load(self, key):
+        args, kwargs = _call_args(key)
+        r = await self._func(*args, **kwargs)
+        return _Null if r is None else r
+
+
+def cached(ttl: float = 0, maxsize: int = 0, **kwargs):
+    """
+    缓存函数结果，支持同步、异步函数，同一参数并发调用只执行一次
+    参数需可hash，抛出异常时不缓存
+    加载按参数组合区分，被装饰的函数可递归或嵌套调用其他被装饰的函数；
+    只有参数组合之间循环依赖（a的计算需要a）时会死锁
+    :param ttl: 过期秒数，0不过期
+    :param maxsize: 最多缓存的参数组合数，0不限制
+    :param kwargs: 其余CacheKey参数，如policy、stats、stale_ttl
+    用法：
+        @cached(ttl=60, maxsize=1024)
+        def get_user(uid): ...
+    被装饰的函数：.cache为底层CacheKey，.cache_delete(*args, **kwargs)删除某组参数的缓存
+    """
+
+    def _decorator(func):
+        if inspect.iscoroutinefunction(func):
+            cache = _AsyncFuncCache(func, ttl=ttl, max_size=maxsize, **kwargs)
+
+            @wraps(func)
+            async def decorated(*args, **kw):
+                r = await cache.get(_make_key(args, kw))
+                return None if r is _Null else r
+        else:
+            cache = _FuncCache(func, ttl=ttl, max_size=maxsize, **kwargs)
+
+            @wraps(func)
+            def decorated(*args, **kw):
+                r = cache.get(_make_key(args, kw))
+                return None if r is _Null else r
+
+        def cache_delete(*args, **kw):
+            cache.del_key(_make_key(args, kw))
+
+        decorated.cache = cache
+        decorated.cache_delete = cache_delete
+        return decorated
+
+    return _decorator
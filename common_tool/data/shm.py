@@ -0,0 +1,316 @@
+import contextlib
+import os
+import struct
+import threading
+import zlib
+from multiprocessing import Lock
+from multiprocessing.shared_memory import SharedMemory
+from time import time, sleep
+from typing import Optional
+
+# seq, slots, data_size, data_used, filled
+_Header = struct.Struct("<QQQQQ")
+# state, hash, offset, key_len, value_len, expire_at
+_Slot = struct.Struct("<IIQIId")
+
+_SlotEmpty = 0
+_SlotUsed = 1
+_SlotDeleted = 2
+
+# 槽位占用超过该比例时清空整表
+_MaxLoad = 0.75
+# 读到正在写入时的重试次数，超过后视为未命中；写入进程中途退出时seq会一直为奇数
+_ReadRetries = 64
+# 等待写锁的秒数，持锁进程中途退出时锁不会释放，超时后放弃写入
+_WriteTimeout = 1
+# 等待跨进程加载锁的秒数，超时后不加锁加载，见load_lock
+_LoadTimeout = 5
+
+# 本线程持有的加载锁，(共享内存名, 锁下标)
+_held = threading.local()
+
+
+class ShmTable:
+    """
+    基于共享内存的哈希表，key为str，value为bytes
+    开放寻址，value追加写入数据区，数据区或槽位用满时整表清空
+    写入持有进程锁，读取不加锁，用seq计数（奇数表示正在写）检测并发写入后重读
+    需在父进程创建，子进程通过继承获得，见ShmM
+    """
+
+    def __init__(self, size: int, slots: int, load_locks: int = 64):
+        """
+        :param size: 数据区字节数
+        :param slots: 槽位数，最多缓存slots * 0.75个key
+        :param load_locks: 跨进程加载锁的个数，按key哈希分配
+        """
+        self._slots = slots
+        self._data_off = _Header.size + slots * _Slot.size
+        self._shm = SharedMemory(create=True, size=self._data_off + size)
+        self._write_lock = Lock()
+        self._load_locks = [Lock() for _ in range(load_locks)]
+        self._owner_pid = os.getpid()  # 仅创建进程负责释放共享内存
+        _Header.pack_into(self._shm.buf, 0, 0, slots, size, 0, 0)
+
+    @staticmethod
+    def _hash(key_b: bytes) -> int:
+        # 不能用hash()，不同进程的str哈希种子可能不同
+        return zlib.crc32(key_b)
+
+    def _header(self) -> tuple:
+        return _Header.unpack_from(self._shm.buf, 0)
+
+    def _seq(self) -> int:
+        return struct.unpack_from("<Q", self._shm.buf, 0)[0]
+
+    def _set_seq(self, seq: int):
+        struct.pack_into("<Q", self._shm.buf, 0, seq)
+
+    def _slot_off(self, i: int) -> int:
+        return _Header.size + i * _Slot.size
+
+    def _find(self, key_b: bytes, h: int) -> tuple[int, Optional[tuple]]:
+        """
+        :return: 命中时为(槽位, 槽位内容)；未命中时为(可写入的槽位, None)
+        """
+        buf = self._shm.buf
+        free = -1
+        i = h % self._slots
+        for _ in range(self._slots):
+            slot = _Slot.unpack_from(buf, self._slot_off(i))
+            state = slot[0]
+            if state == _SlotEmpty:
+                return (free if free >= 0 else i), None
+            if state == _SlotDeleted:
+                if free < 0:
+                    free = i
+            elif slot[1] == h and slot[3] == len(key_b):
+                off = self._data_off + slot[2]
+                if buf[off:off + slot[3]] == key_b:
+                    return i, slot
+            i = (i + 1) % self._slots
+        return free, None
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        :return: 未命中、已过期，或一直在写入无法读取时为None
+        """
+        key_b = key.encode("utf-8")
+        h = self._hash(key_b)
+        for i in range(_ReadRetries):
+            if i:
+                # 前几次只让出CPU，之后逐渐等待
+                sleep(0 if i < 8 else 0.0005)
+            seq = self._seq()
+            if seq & 1:
+                continue
+            try:
+                _, slot = self._find(key_b, h)
+                value = None
+                if slot is not None and (not slot[5] or slot[5] > time()):
+                    off = self._data_off + slot[2] + slot[3]
+                    value = bytes(self._shm.buf[off:off + slot[4]])
+            except struct.error:
+                # 读到了写入中的槽位
+                value = None
+            if self._seq() == seq:
+                return value
+        return None
+
+    @contextlib.contextmanager
+    def _writing(self):
+        """
+        :return: 是否拿到写锁，未拿到时不能写入
+        """
+        if not self._write_lock.acquire(timeout=_WriteTimeout):
+            yield False
+            return
+        try:
+            seq = self._seq()
+            broken = seq & 1
+            # 上一个写入进程中途退出，seq仍为奇数，表内容可能不完整，清空
+            seq &= ~1
+            self._set_seq(seq + 1)
+            if broken:
+                self._clear()
+            try:
+                yield True
+            finally:
+                self._set_seq(seq + 2)
+        finally:
+            self._write_lock.release()
+
+    def _clear(self):
+        # 调用方持有写锁
+        buf = self._shm.buf
+        empty = bytes(self._slots * _Slot.size)
+        buf[_Header.size:self._data_off] = empty
+        _, slots, size, _, _ = self._header()
+        _Header.pack_into(buf, 0, self._seq(), slots, size, 0, 0)
+
+    def set(self, key: str, value: bytes, expire_at: float = 0) -> bool:
+        """
+        :param key:
+        :param value:
+        :param expire_at: 过期时间戳，0不过期
+        :return: value超过数据区大小时不写入，返回False
+        """
+        key_b = key.encode("utf-8")
+        h = self._hash(key_b)
+        need = len(key_b) + len(value)
+        with self._writing() as ok:
+            if not ok:
+                return False
+            seq, slots, size, used, filled = self._header()
+            if need > size:
+                return False
+            i, slot = self._find(key_b, h)
+            if used + need > size or (slot is None and filled + 1 > slots * _MaxLoad):
+                self._clear()
+                used, filled = 0, 0
+                i, slot = self._find(key_b, h)
+
+            buf = self._shm.buf
+            # 复用删除标记的槽位不增加占用数
+            if struct.unpack_from("<I", buf, self._slot_off(i))[0] == _SlotEmpty:
+                filled += 1
+            off = self._data_off + used
+            buf[off:off + len(key_b)] = key_b
+            buf[off + len(key_b):off + need] = value
+            _Slot.pack_into(buf, self._slot_off(i), _SlotUsed, h, used, len(key_b), len(value), expire_at)
+            _Header.pack_into(buf, 0, seq, slots, size, used + need, filled)
+        return True
+
+    def delete(self, key: str):
+        key_b = key.encode("utf-8")
+        h = self._hash(key_b)
+        with self._writing() as ok:
+            if not ok:
+                return
+            i, slot = self._find(key_b, h)
+            if slot is None:
+                return
+            # 删除标记仍占用槽位，直到整表清空
+            struct.pack_into("<I", self._shm.buf, self._slot_off(i), _SlotDeleted)
+
+    def clear(self):
+        with self._writing() as ok:
+            if ok:
+                self._clear()
+
+    @contextlib.contextmanager
+    def load_lock(self, key: str):
+        """
+        跨进程加载同一key时加锁，锁按key哈希分配，多个key共用一把
+        本线程已持有同一把锁（加载中get同一把锁的其他key）时不再加锁；
+        等待超过_LoadTimeout秒（进程间加载互相依赖、持锁进程中途退出）时不加锁，此时可能重复加载
+        :return: 是否拿到锁
+        """
+        i = self._hash(key.encode("utf-8")) % len(self._load_locks)
+        held = getattr(_held, "locks", None)
+        if held is None:
+            held = _held.locks = set()
+        mark = (self._shm.name, i)
+        lock = self._load_locks[i]
+        if mark in held or not lock.acquire(timeout=_LoadTimeout):
+            yield False
+            return
+        held.add(mark)
+        try:
+            yield True
+        finally:
+            held.discard(mark)
+            lock.release()
+
+    def __len__(self):
+        """
+        占用的槽位数，含删除标记
+        """
+        return self._header()[4]
+
+    def close(self):
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+
+
+# seq
+_BusHeader = struct.Struct("<Q")
+# seq, pid, key_len，key_len为-1表示需清空整个缓存
+_BusSlot = struct.Struct("<QIi")
+_BusSlotSize = 256
+_BusKeyMax = _BusSlotSize - _BusSlot.size
+
+
+class InvalidBus:
+    """
+    跨进程缓存失效广播，共享内存环形队列
+    发布方写入失效的key并增加序号，各进程get时对比序号，取出新的失效记录
+    落后超过slots条，或key过长时，无法确定失效了哪些key，清空本进程缓存
+    需在父进程创建，子进程通过继承获得，见BusM
+    """
+
+    def __init__(self, slots: int = 4096):
+        """
+        :param slots: 环形队列长度
+        """
+        self._slots = slots
+        self._shm = SharedMemory(create=True, size=_BusHeader.size + slots * _BusSlotSize)
+        self._lock = Lock()
+        self._owner_pid = os.getpid()  # 仅创建进程负责释放共享内存
+        _BusHeader.pack_into(self._shm.buf, 0, 0)
+
+    def _slot_off(self, seq: int) -> int:
+        return _BusHeader.size + (seq % self._slots) * _BusSlotSize
+
+    def seq(self) -> int:
+        return _BusHeader.unpack_from(self._shm.buf, 0)[0]
+
+    def publish(self, key: Optional[str]):
+        """
+        :param key: 失效的key，None表示清空整个缓存
+        """
+        key_b = key.encode("utf-8") if isinstance(key, str) else b""
+        key_len = len(key_b) if isinstance(key, str) and len(key_b) <= _BusKeyMax else -1
+        buf = self._shm.buf
+        with self._lock:
+            seq = self.seq() + 1
+            off = self._slot_off(seq)
+            _BusSlot.pack_into(buf, off, seq, os.getpid(), key_len)
+            if key_len > 0:
+                buf[off + _BusSlot.size:off + _BusSlot.size + key_len] = key_b
+            # 先写记录再更新序号，读取方看到序号时记录已完整
+            _BusHeader.pack_into(buf, 0, seq)
+
+    def poll(self, last: int) -> tuple[int, Optional[list[str]]]:
+        """
+        取出last之后其他进程发布的失效key
+        :param last: 上次poll返回的序号
+        :return: (最新序号, 失效的key)，key列表为None时需清空整个缓存
+        """
+        cur = self.seq()
+        if cur == last:
+            return cur, []
+        if cur - last > self._slots:
+            return cur, None
+        buf = self._shm.buf
+        pid = os.getpid()
+        keys = []
+        for seq in range(last + 1, cur + 1):
+            off = self._slot_off(seq)
+            slot_seq, slot_pid, key_len = _BusSlot.unpack_from(buf, off)
+            key_b = bytes(buf[off + _BusSlot.size:off + _BusSlot.size + max(key_len, 0)])
+            # 读取期间被新记录覆盖
+            if slot_seq != seq or _BusSlot.unpack_from(buf, off)[0] != seq:
+                return cur, None
+            if slot_pid == pid:
+                continue
+            if key_len < 0:
+                return cur, None
+            keys.append(key_b.decode("utf-8"))
+        return cur, keys
+
+    def close(self):
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
@@ -0,0 +1,90 @@
+from bisect import bisect_left
+
+# 加载耗时直方图的桶上限，毫秒
+_LoadBuckets = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class CacheStats:
+    """
+    缓存命中、加载统计
+    计数不加锁，多线程下可能有少量误差
+    """
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.negative_hits = 0
+        self.disk_hits = 0
+        self.loads = 0
+        self.load_errors = 0
+        self.load_time = 0.0
+        self.load_time_max = 0.0
+        self.evictions = 0
+        self.expirations = 0
+        # 最后一个桶记录超过最大上限的
+        self._load_hist = [0] * (len(_LoadBuckets) + 1)
+
+    def hit(self, negative: bool = False):
+        if negative:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+
+    def miss(self):
+        self.misses += 1
+
+    def load(self, cost: float, ok: bool = True):
+        """
+        :param cost: 加载耗时，秒
+        :param ok: 加载是否成功
+        """
+        self.loads += 1
+        if not ok:
+            self.load_errors += 1
+        self.load_time += cost
+        if cost > self.load_time_max:
+            self.load_time_max = cost
+        self._load_hist[bisect_left(_LoadBuckets, cost * 1000)] += 1
+
+    def evict(self, n: int = 1):
+        self.evictions += n
+
+    def expire(self, n: int = 1):
+        self.expirations += n
+
+    def _load_percentile(self, p: float) -> float:
+        """
+        按直方图估算加载耗时分位数，返回所在桶的上限，毫秒
+        """
+        target = self.loads * p
+        count = 0
+        for i, n in enumerate(self._load_hist):
+            count += n
+            if n and count >= target:
+                return _LoadBuckets[i] if i < len(_LoadBuckets) else self.load_time_max * 1000
+        return 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.negative_hits + self.misses
+        return (self.hits + self.negative_hits) / total if total else 0
+
+    def dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "negative_hits": self.negative_hits,
+            "disk_hits": self.disk_hits,
+            "hit_rate": round(self.hit_rate, 4),
+            "loads": self.loads,
+            "load_errors": self.load_errors,
+            "load_ms_avg": round(self.load_time * 1000 / self.loads, 3) if self.loads else 0,
+            "load_ms_max": round(self.load_time_max * 1000, 3),
+            "load_ms_p50": self._load_percentile(0.5),
+            "load_ms_p99": self._load_percentile(0.99),
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def reset(self):
+        self.__init__()
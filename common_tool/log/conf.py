@@ -1,5 +1,7 @@
 from .noun import (
-    _DefaultLevel, _DefaultFmt, _DefaultTimeFmt, _DefaultFileName, _DefaultLogPath
+    _DefaultLevel, _DefaultFmt, _DefaultTimeFmt, _DefaultFileName, _DefaultJsonFileName, _DefaultLogPath,
+    _DefaultQueueMaxSize, _DefaultQueuePolicy, _DefaultQueueTimeout, _DefaultQueueSample, _DefaultRingSize,
+    _DefaultLimitReport
 )
 
 
@@ -30,7 +32,7 @@ class OutputConfig(dict):
 
     @property
     def filename(self) -> str:
-        return self.writer_config.get("filename", _DefaultFileName)
+        return self.writer_config.get("filename", _DefaultJsonFileName if self.writer == "json" else _DefaultFileName)
 
     @property
     def log_path(self) -> str:
@@ -43,3 +45,89 @@ class OutputConfig(dict):
     @property
     def max_age(self) -> str:
         return self.writer_config.get("max_age", "MIDNIGHT")
+
+    @property
+    def direct(self) -> bool:
+        """
+        各进程直接写出，不经过QLogM；文件名为log_f_prefix + pid + filename，可用merge合并
+        """
+        return self.writer_config.get("direct", False)
+
+    @property
+    def compress(self) -> str:
+        """
+        轮转后的压缩方式，gzip、zstd，为空不压缩
+        """
+        return self.writer_config.get("compress", "")
+
+
+class QueueConfig(dict):
+    """
+    配置文件中的log_queue，子进程到父进程的日志队列
+    """
+
+    @property
+    def transport(self) -> str:
+        """
+        queue或ring，ring见LogRing
+        """
+        return self.get("transport", "queue")
+
+    @property
+    def maxsize(self) -> int:
+        return self.get("maxsize", _DefaultQueueMaxSize)
+
+    @property
+    def policy(self) -> str:
+        """
+        队列满时的处理，block、drop_debug、sample，见QLogM
+        transport为ring时不生效，由overflow决定
+        """
+        return self.get("policy", _DefaultQueuePolicy)
+
+    @property
+    def timeout(self) -> float:
+        return self.get("timeout", _DefaultQueueTimeout)
+
+    @property
+    def sample(self) -> int:
+        return self.get("sample", _DefaultQueueSample)
+
+    @property
+    def ring_size(self) -> int:
+        return self.get("ring_size", _DefaultRingSize)
+
+    @property
+    def overflow(self) -> str:
+        """
+        ring满时的处理，block、drop_oldest、drop_newest，见LogRing
+        """
+        return self.get("overflow", "block")
+
+
+class LimitConfig(dict):
+    """
+    配置文件log中的rate_limit项，按调用点（文件名:行号）限流
+    """
+
+    @property
+    def rate(self) -> float:
+        """
+        每个调用点每秒最多输出条数，0不限流
+        """
+        return self.get("rate", 0)
+
+    @property
+    def burst(self) -> float:
+        return self.get("burst", self.rate)
+
+    @property
+    def sample(self) -> int:
+        """
+        超过限流后每sample条保留1条，0全部丢弃
+        """
+        return self.get("sample", 0)
+
+    @property
+    def report_interval(self) -> float:
+        return self.get("report_interval", _DefaultLimitReport)
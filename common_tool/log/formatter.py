@@ -0,0 +1,115 @@
+import json
+import logging
+import re
+import time
+
+# 非json类型转为str，不抛异常
+_Encode = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=str).encode
+
+_FieldReg = re.compile(r"%\((\w+)\)")
+_Message = "%(message)s"
+# 缓存的秒数、前缀个数上限，超过后清空
+_MaxTimes = 8
+_MaxPrefixes = 4096
+
+
+class CachedFormatter(logging.Formatter):
+    """
+    时间精度为秒，同一秒的时间字符串只strftime一次
+    fmt中%(message)s之前的部分按字段值缓存，同一秒、同一调用点的日志只格式化一次前缀
+    仅支持%风格、%(message)s之后没有字段的fmt，其他情况同logging.Formatter
+    """
+
+    def __init__(self, fmt: str = None, datefmt: str = None):
+        super().__init__(fmt=fmt, datefmt=datefmt)
+        self._times: dict[int, str] = {}
+        self._prefixes: dict[tuple, str] = {}
+        self._pre = None
+        fmt = self._style._fmt
+        if isinstance(self._style, logging.PercentStyle) and fmt.count(_Message) == 1:
+            pre, post = fmt.split(_Message)
+            if not _FieldReg.search(post):
+                self._pre = pre
+                self._pre_fields = tuple(_FieldReg.findall(pre))
+                self._post = post % {}
+
+    def formatTime(self, record: logging.LogRecord, datefmt: str = None) -> str:
+        if datefmt is not None and datefmt != self.datefmt:
+            return super().formatTime(record, datefmt)
+        sec = int(record.created)
+        s = self._times.get(sec)
+        if s is None:
+            if len(self._times) >= _MaxTimes:
+                self._times.clear()
+            s = time.strftime(self.datefmt or self.default_time_format, self.converter(sec))
+            self._times[sec] = s
+        if not self.datefmt and self.default_msec_format:
+            s = self.default_msec_format % (s, record.msecs)
+        return s
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        if self._pre is None:
+            return super().formatMessage(record)
+        d = record.__dict__
+        key = tuple([d.get(field) for field in self._pre_fields])
+        try:
+            prefix = self._prefixes.get(key)
+        except TypeError:
+            # 字段值不可hash，如with_fields的fields，不缓存
+            return self._pre % d + record.message + self._post
+        if prefix is None:
+            if len(self._prefixes) >= _MaxPrefixes:
+                self._prefixes.clear()
+            prefix = self._pre % d
+            self._prefixes[key] = prefix
+        return prefix + record.message + self._post
+
+
+class JsonFormatter(CachedFormatter):
+    """
+    每条日志一行json：
+        {"time":..,"ts":..,"level":..,"file":..,"line":..,"pid":..,"msg":..,with_fields绑定的字段..,"exc":..}
+    绑定字段的key按字段集合缓存编码结果，同一组字段只编码一次key
+    """
+
+    # 需要传输的LogRecord字段，见wire
+    fields = ("filename", "lineno", "process", "fields")
+
+    def __init__(self, datefmt: str = None):
+        super().__init__(datefmt=datefmt)
+        # 字段名tuple到编码后的',"key":'
+        self._keys: dict[tuple, tuple] = {}
+
+    def _encode_keys(self, names: tuple) -> tuple:
+        keys = self._keys.get(names)
+        if keys is None:
+            keys = tuple(f",{_Encode(str(name))}:" for name in names)
+            self._keys[names] = keys
+        return keys
+
+    def format(self, record: logging.LogRecord) -> str:
+        parts = [
+            '{"time":', _Encode(self.formatTime(record, self.datefmt)),
+            ',"ts":', repr(record.created),
+            ',"level":"', record.levelname,
+            '","file":', _Encode(record.filename),
+            ',"line":', str(record.lineno),
+            ',"pid":', str(record.process),
+            ',"msg":', _Encode(record.getMessage()),
+        ]
+        fields = getattr(record, "fields", None)
+        if fields:
+            names = tuple(fields)
+            for key, name in zip(self._encode_keys(names), names):
+                parts.append(key)
+                parts.append(_Encode(fields[name]))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            parts.append(',"exc":')
+            parts.append(_Encode(record.exc_text))
+        if record.stack_info:
+            parts.append(',"stack":')
+            parts.append(_Encode(record.stack_info))
+        parts.append("}")
+        return "".join(parts)
@@ -0,0 +1,99 @@
+import logging
+import os
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from .conf import LimitConfig
+
+
+class _Site:
+    __slots__ = ("tokens", "last", "over", "suppressed")
+
+    def __init__(self, tokens: float, now: float):
+        self.tokens = tokens
+        self.last = now
+        self.over = 0  # 超过限流的条数，用于采样
+        self.suppressed = 0  # 上次输出后被丢弃的条数
+
+
+class CallSiteLimiter(logging.Filter):
+    """
+    按调用点（文件名:行号）令牌桶限流，在子进程入队前丢弃，减少进程间传输
+    有日志被丢弃后，由后台线程每隔report_interval秒输出一条WARNING，列出各调用点被丢弃的条数
+    计数不加锁，多线程下可能有少量误差
+    """
+
+    def __init__(self, logger: logging.Logger, conf: LimitConfig):
+        super().__init__()
+        self._logger = logger
+        self._rate = conf.rate
+        self._burst = max(conf.burst, 1)
+        self._sample = conf.sample
+        self._interval = conf.report_interval
+        self._sites: dict[tuple, _Site] = {}
+        self._report_lock = Lock()
+        self._report_stop = Event()
+        self._reporter_pid = 0  # fork后子进程需重新启动输出线程
+
+    def _start_reporter(self):
+        if self._reporter_pid == os.getpid():
+            return
+        with self._report_lock:
+            if self._reporter_pid == os.getpid():
+                return
+            self._reporter_pid = os.getpid()
+            t = Thread(target=self._report_loop, name="log-limit-reporter")
+            t.daemon = True
+            t.start()
+
+    def _report_loop(self):
+        while not self._report_stop.wait(self._interval):
+            self.report()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        now = monotonic()
+        key = (record.filename, record.lineno)
+        site = self._sites.get(key)
+        if site is None:
+            site = self._sites[key] = _Site(self._burst, now)
+        else:
+            site.tokens = min(self._burst, site.tokens + (now - site.last) * self._rate)
+            site.last = now
+        if site.tokens >= 1:
+            site.tokens -= 1
+            return True
+        site.over += 1
+        if self._sample and site.over % self._sample == 0:
+            return True
+        site.suppressed += 1
+        self._start_reporter()
+        return False
+
+    def report(self):
+        """
+        输出并清零被丢弃的条数
+        """
+        if not self._report_lock.acquire(False):
+            return
+        try:
+            suppressed = []
+            for (filename, lineno), site in list(self._sites.items()):
+                if site.suppressed:
+                    suppressed.append(f"{filename}:{lineno}={site.suppressed}")
+                    site.suppressed = 0
+            if not suppressed:
+                return
+            record = self._logger.makeRecord(
+                self._logger.name, logging.WARNING, __file__, 0,
+                f"rate limited, suppressed {', '.join(suppressed)}", None, None)
+            # 不经过logger的filter，避免被自身限流
+            self._logger.callHandlers(record)
+        finally:
+            self._report_lock.release()
+
+    def close(self):
+        """
+        停止输出线程，输出剩余的丢弃条数，关闭logger前调用
+        """
+        self._report_stop.set()
+        self.report()
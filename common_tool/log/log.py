@@ -4,10 +4,11 @@ import os.path
 from abc import ABCMeta
 from typing import List
 
-from .conf import OutputConfig
+from .conf import OutputConfig, LimitConfig
+from .limit import CallSiteLimiter
 from .mp_handler import MultiProcessingHandler
 from .noun import LogLevel, _DefaultFileName, LevelToLoggingLevel
-from .writer import BaseWriter, ConsoleWriter, FileWriter
+from .writer import BaseWriter, ConsoleWriter, FileWriter, JsonWriter
 
 from common_tool.errno import Error, OK
 
@@ -41,7 +42,7 @@ class BaseLogger(metaclass=ABCMeta):
 
 
 class LoggingLogger(BaseLogger):
-    def __init__(self, writers: List[BaseWriter]):
+    def __init__(self, writers: List[BaseWriter], limit: LimitConfig = None):
         # set default filename and level
         super().__init__(writers)
         self.filename = _DefaultFileName
@@ -65,12 +66,25 @@ class LoggingLogger(BaseLogger):
             self.logger.setLevel(logging.DEBUG)
 
         self.logger.handlers = []
+        # direct的writer在本进程直接写出，其余经QLogM由父进程写出
+        queued = [writer.handler for writer in writers if not writer.output_config.direct]
+        if queued:
+            self.logger.addHandler(MultiProcessingHandler("mp-handler", queued))
         for writer in writers:
-            self.logger.addHandler(MultiProcessingHandler(f"mp-handler-{writer.name}", writer.handler))
+            if writer.output_config.direct:
+                self.logger.addHandler(writer.handler)
+
+        self.logger.filters = []
+        self.limiter = None
+        if limit and limit.rate:
+            self.limiter = CallSiteLimiter(self.logger, limit)
+            self.logger.addFilter(self.limiter)
 
         self.logger.makeRecord = make_record
 
     def close(self):
+        if self.limiter:
+            self.limiter.close()
         handlers = self.logger.handlers[:]
         for handler in handlers:
             self.logger.removeHandler(handler)
@@ -79,65 +93,124 @@ class LoggingLogger(BaseLogger):
     def set_level(self, level: LogLevel):
         self.logger.setLevel(LevelToLoggingLevel.get(level))
 
-    def trace(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
+    def with_fields(self, **kwargs) -> "FieldsLogger":
+        return FieldsLogger(kwargs, self)
+
+    def _extra(self, kwargs: dict) -> dict:
+        # 调用链：调用方 -> debug等 -> _extra
+        extra = kwargs.get('extra')
+        if extra is None:
+            extra = kwargs['extra'] = {}
+        if 'filename' not in extra or 'lineno' not in extra:
+            frame = sys._getframe(2)
+            if 'filename' not in extra:
+                extra['filename'] = caller_filename(frame.f_code)
+            if 'lineno' not in extra:
+                extra['lineno'] = frame.f_lineno
+        return kwargs
 
-        self.logger.debug(format_str, *args, **kwargs)
+    def trace(self, format_str: str, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self.logger.debug(format_str, *args, **self._extra(kwargs))
 
     def debug(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
-
-        self.logger.debug(format_str, *args, **kwargs)
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return
+        self.logger.debug(format_str, *args, **self._extra(kwargs))
 
     def info(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
-
-        self.logger.info(format_str, *args, **kwargs)
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        self.logger.info(format_str, *args, **self._extra(kwargs))
 
     def warning(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
-
-        self.logger.warning(format_str, *args, **kwargs)
+        if not self.logger.isEnabledFor(logging.WARNING):
+            return
+        self.logger.warning(format_str, *args, **self._extra(kwargs))
 
     def error(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
+        if not self.logger.isEnabledFor(logging.ERROR):
+            return
+        self.logger.error(format_str, *args, **self._extra(kwargs))
+
+    def fatal(self, format_str: str, *args, **kwargs):
+        if not self.logger.isEnabledFor(logging.CRITICAL):
+            return
+        self.logger.fatal(format_str, *args, **self._extra(kwargs))
 
-        self.logger.error(format_str, *args, **kwargs)
+
+class FieldsLogger(BaseLogger):
+    """
+    绑定字段的子logger，每条日志带上fields属性，json writer输出为独立字段，fmt中可用%(fields)s
+    字段值需可pickle、json序列化
+    用法：
+        log = logger.with_fields(task="crawl", url=url)
+        log.info("done")
+    """
+
+    def __init__(self, fields: dict, parent: LoggingLogger = None):
+        """
+        :param fields: 绑定的字段
+        :param parent: 为空时使用全局logger，子进程重新init后仍可用
+        """
+        super().__init__(parent.writers if parent else [])
+        self.fields = fields
+        self._parent = parent
+
+    def with_fields(self, **kwargs) -> "FieldsLogger":
+        return FieldsLogger({**self.fields, **kwargs}, self._parent)
+
+    def _log(self, level: int, format_str: str, args: tuple, kwargs: dict):
+        parent = self._parent or globals().get("_Logger")
+        if parent is None:
+            print(f"{logging.getLevelName(level).lower()}: ", format_str % args, self.fields)
+            return
+        if not parent.logger.isEnabledFor(level):
+            return
+        extra = kwargs.get('extra')
+        if extra is None:
+            extra = kwargs['extra'] = {}
+        # 调用链：调用方 -> debug等 -> _log
+        if 'filename' not in extra or 'lineno' not in extra:
+            frame = sys._getframe(2)
+            if 'filename' not in extra:
+                extra['filename'] = caller_filename(frame.f_code)
+            if 'lineno' not in extra:
+                extra['lineno'] = frame.f_lineno
+        extra['fields'] = {**self.fields, **extra['fields']} if 'fields' in extra else self.fields
+        parent.logger.log(level, format_str, *args, **kwargs)
+
+    def trace(self, format_str: str, *args, **kwargs):
+        self._log(logging.DEBUG, format_str, args, kwargs)
+
+    def debug(self, format_str: str, *args, **kwargs):
+        self._log(logging.DEBUG, format_str, args, kwargs)
+
+    def info(self, format_str: str, *args, **kwargs):
+        self._log(logging.INFO, format_str, args, kwargs)
+
+    def warning(self, format_str: str, *args, **kwargs):
+        self._log(logging.WARNING, format_str, args, kwargs)
+
+    def error(self, format_str: str, *args, **kwargs):
+        self._log(logging.ERROR, format_str, args, kwargs)
 
     def fatal(self, format_str: str, *args, **kwargs):
-        if 'extra' not in kwargs:
-            kwargs['extra'] = {}
-        if 'filename' not in kwargs['extra']:
-            kwargs['extra']['filename'] = os.path.split(sys._getframe(1).f_code.co_filename)[1]
-        if 'lineno' not in kwargs['extra']:
-            kwargs['extra']['lineno'] = sys._getframe(1).f_lineno
+        self._log(logging.CRITICAL, format_str, args, kwargs)
+
 
-        self.logger.fatal(format_str, *args, **kwargs)
+# 代码文件路径对应的文件名，避免每条日志os.path.split
+_FileNames: dict[str, str] = {}
+
+
+def caller_filename(code) -> str:
+    path = code.co_filename
+    name = _FileNames.get(path)
+    if name is None:
+        name = os.path.split(path)[1]
+        _FileNames[path] = name
+    return name
 
 
 # overwrite logging makeRecord
@@ -158,6 +231,7 @@ def make_record(name, level, fn, lno, msg, args, exc_info,
 _Writer = {
     "console": ConsoleWriter,
     "file": FileWriter,
+    "json": JsonWriter,
 }
 
 _Logger: LoggingLogger
@@ -167,7 +241,12 @@ def init(log_conf: list[dict]) -> Error:
     output_config = [OutputConfig(item) for item in log_conf]
     global _Logger
     writers = []
+    limit = None
     for conf in output_config:
+        # 调用点限流，不是writer
+        if "rate_limit" in conf:
+            limit = LimitConfig(conf["rate_limit"])
+            continue
         cls = _Writer.get(conf.writer)
         if not cls:
             print(f"init_log find no {conf.writer}, optional {_Writer.keys()}")
@@ -175,7 +254,7 @@ def init(log_conf: list[dict]) -> Error:
         writers.append(cls(conf))
     if len(writers) == 0:
         writers.append(ConsoleWriter(OutputConfig()))
-    _Logger = LoggingLogger(writers)
+    _Logger = LoggingLogger(writers, limit)
     return OK
 
 
@@ -1,9 +1,9 @@
 import json
-import os.path
+import logging
 import sys
 import traceback
 
-from .log import LoggingLogger
+from .log import LoggingLogger, FieldsLogger, caller_filename
 from common_tool.log import log
 
 
@@ -13,17 +13,27 @@ from common_tool.log import log
 def ensure_filepath_and_lineno(**kwargs):
     if 'extra' not in kwargs:
         kwargs['extra'] = {}
-    if 'filename' not in kwargs['extra']:
-        kwargs['extra']['filename'] = os.path.split(sys._getframe(2).f_code.co_filename)[1]
-    if 'lineno' not in kwargs['extra']:
-        kwargs['extra']['lineno'] = sys._getframe(2).f_lineno
+    extra = kwargs['extra']
+    if 'filename' not in extra or 'lineno' not in extra:
+        frame = sys._getframe(2)
+        if 'filename' not in extra:
+            extra['filename'] = caller_filename(frame.f_code)
+        if 'lineno' not in extra:
+            extra['lineno'] = frame.f_lineno
     return kwargs
 
 
+def _disabled(_Logger: LoggingLogger, level: int) -> bool:
+    # 先判断级别，未开启时不做栈帧查找
+    return _Logger is not None and not _Logger.logger.isEnabledFor(level)
+
+
 def debug(format_str: str, *args, **kwargs):
+    _Logger: LoggingLogger = getattr(log, "_Logger", None)
+    if _disabled(_Logger, logging.DEBUG):
+        return
     try:
         kwargs = ensure_filepath_and_lineno(**kwargs)
-        _Logger: LoggingLogger = getattr(log, "_Logger", None)
         if _Logger:
             _Logger.debug(format_str, *args, **kwargs)
         else:
@@ -36,9 +46,11 @@ def debug(format_str: str, *args, **kwargs):
 
 
 def info(format_str: str, *args, **kwargs):
+    _Logger: LoggingLogger = getattr(log, "_Logger", None)
+    if _disabled(_Logger, logging.INFO):
+        return
     try:
         kwargs = ensure_filepath_and_lineno(**kwargs)
-        _Logger: LoggingLogger = getattr(log, "_Logger", None)
         if _Logger:
             _Logger.info(format_str, *args, **kwargs)
         else:
@@ -51,9 +63,11 @@ def info(format_str: str, *args, **kwargs):
 
 
 def warning(format_str: str, *args, **kwargs):
+    _Logger: LoggingLogger = getattr(log, "_Logger", None)
+    if _disabled(_Logger, logging.WARNING):
+        return
     try:
         kwargs = ensure_filepath_and_lineno(**kwargs)
-        _Logger: LoggingLogger = getattr(log, "_Logger", None)
         if _Logger:
             _Logger.warning(format_str, *args, **kwargs)
         else:
@@ -66,9 +80,11 @@ def warning(format_str: str, *args, **kwargs):
 
 
 def error(format_str: str, *args, **kwargs):
+    _Logger: LoggingLogger = getattr(log, "_Logger", None)
+    if _disabled(_Logger, logging.ERROR):
+        return
     try:
         kwargs = ensure_filepath_and_lineno(**kwargs)
-        _Logger: LoggingLogger = getattr(log, "_Logger", None)
         if _Logger:
             _Logger.error(format_str, *args, **kwargs)
         else:
@@ -81,9 +97,11 @@ def error(format_str: str, *args, **kwargs):
 
 
 def fatal(format_str: str, *args, **kwargs):
+    _Logger: LoggingLogger = getattr(log, "_Logger", None)
+    if _disabled(_Logger, logging.CRITICAL):
+        return
     try:
         kwargs = ensure_filepath_and_lineno(**kwargs)
-        _Logger: LoggingLogger = getattr(log, "_Logger", None)
         if _Logger:
             _Logger.fatal(format_str, *args, **kwargs)
         else:
@@ -93,3 +111,10 @@ def fatal(format_str: str, *args, **kwargs):
               f"args: {json.dumps(args)}; "
               f"err: {repr(err)}"
               f"\n{traceback.format_exc()}")
+
+
+def with_fields(**kwargs) -> FieldsLogger:
+    """
+    绑定字段的子logger，见FieldsLogger
+    """
+    return FieldsLogger(kwargs)
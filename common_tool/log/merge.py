@@ -0,0 +1,99 @@
+"""
+按时间合并多个进程各自写出的日志文件，见writer_config.direct
+用法：
+    python -m common_tool.log.merge -o merged.log log/example.*.info.log
+默认格式时间精度为秒，同一秒内按文件顺序排列；json writer按ts排序，精度到微秒
+不以时间开头的行（如异常堆栈）属于上一条日志
+"""
+import argparse
+import glob
+import heapq
+import json
+import re
+import sys
+import time
+from typing import Iterator, TextIO
+
+_TimeReg = re.compile(r"(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?:[.,](\d+))?")
+# 时间只在行首附近查找，避免匹配到日志内容
+_TimeSearchLen = 64
+
+
+class _TimeParser:
+    def __init__(self):
+        # 同一秒的时间字符串只解析一次
+        self._secs: dict[str, float] = {}
+
+    def parse(self, line: str):
+        """
+        :return: 时间戳，不是一条日志的开头时为None
+        """
+        if line.startswith("{"):
+            try:
+                return float(json.loads(line)["ts"])
+            except (ValueError, KeyError, TypeError):
+                return None
+        m = _TimeReg.search(line, 0, _TimeSearchLen)
+        if not m:
+            return None
+        s, frac = m.groups()
+        sec = self._secs.get(s)
+        if sec is None:
+            sec = time.mktime(time.strptime(s.replace("T", " "), "%Y-%m-%d %H:%M:%S"))
+            self._secs[s] = sec
+        return sec + float(f"0.{frac}") if frac else sec
+
+
+def _records(f: TextIO, parser: _TimeParser) -> Iterator[tuple[float, str]]:
+    ts, lines = 0.0, []
+    for line in f:
+        t = parser.parse(line)
+        if t is None:
+            lines.append(line)
+            continue
+        if lines:
+            yield ts, "".join(lines)
+        ts, lines = t, [line]
+    if lines:
+        yield ts, "".join(lines)
+
+
+def merge_files(paths: list[str], out: TextIO) -> int:
+    """
+    每个文件内的日志已按时间排序，多路归并
+    :param paths: 日志文件
+    :param out: 输出
+    :return: 合并的日志条数
+    """
+    parser = _TimeParser()
+    files = [open(path, "r", encoding="utf-8", errors="replace") for path in paths]
+    n = 0
+    try:
+        for _, record in heapq.merge(*[_records(f, parser) for f in files], key=lambda r: r[0]):
+            if not record.endswith("\n"):
+                record += "\n"
+            out.write(record)
+            n += 1
+    finally:
+        for f in files:
+            f.close()
+    return n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="merge per-process log files by time")
+    parser.add_argument("paths", nargs="+", help="log files, glob supported")
+    parser.add_argument("-o", "--output", default="-", help="output file, default stdout")
+    args = parser.parse_args()
+
+    paths = sorted({path for pattern in args.paths for path in (glob.glob(pattern) or [pattern])})
+    if args.output == "-":
+        merge_files(paths, sys.stdout)
+        return
+    with open(args.output, "w", encoding="utf-8") as out:
+        n = merge_files(paths, out)
+    print(f"merged {n} records from {len(paths)} files into {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,12 @@
 import logging
+import os
+import time
+from multiprocessing.util import Finalize
 from queue import Empty
-from threading import Event
+from threading import Event, Lock, Thread
 
 from .q import QLogM
+from .wire import wire_fields, encode, decode
 """
 Note that on Windows child processes will only inherit the level of the parent process’s logger –
 any other customization of the logger will not be inherited.
@@ -15,11 +19,83 @@ This is called "spawning".
 """
 
 
-def receive(close_event: Event, sub_handler):
+# 攒够多少条立即发送
+_BatchSize = 64
+# 不足_BatchSize时，最多等待多少秒发送
+_FlushInterval = 0.005
+
+# 当前使用的handler，重新init时替换；fork、退出的回调只注册一次，
+# register_at_fork无法取消，每个handler注册会使旧的handler一直存活
+_current = None
+_finalize_pid = 0
+
+
+def _after_fork():
+    # fork的子进程丢弃父进程未发送的日志，防止重复
+    if _current is not None:
+        _current._after_fork()
+
+
+def _flush_current():
+    if _current is not None:
+        _current.flush()
+
+
+def _set_current(handler):
+    global _current, _finalize_pid
+    _current = handler
+    # 子进程退出时不执行atexit，用Finalize保证退出前发送
+    # Queue关闭的Finalize优先级为10，需先于它执行；子进程启动时会清空Finalize，需在本进程重新注册
+    if _finalize_pid != os.getpid():
+        _finalize_pid = os.getpid()
+        Finalize(None, _flush_current, exitpriority=20)
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def dispatch(record, sub_handlers):
+    # 每条日志分发给所有级别满足的writer
+    for sub_handler in sub_handlers:
+        if record.levelno >= sub_handler.level:
+            sub_handler.handle(record)
+
+
+def _dispatch_item(item, sub_handlers):
+    # 队列中的一项是一批日志，见wire
+    if isinstance(item, tuple):
+        fields, rows = item
+        for row in rows:
+            dispatch(decode(fields, row), sub_handlers)
+    else:
+        dispatch(item, sub_handlers)
+
+
+def _drain(sub_handlers):
+    # 关闭前处理已在队列中的日志
+    try:
+        while True:
+            _dispatch_item(QLogM.receive_nowait(), sub_handlers)
+    except (Empty, EOFError, OSError, ValueError):
+        pass
+
+
+def receive(close_event: Event, sub_handlers, running: Event = None, stopped: Event = None):
+    if running:
+        running.set()
+    try:
+        _receive(close_event, sub_handlers)
+        _drain(sub_handlers)
+    finally:
+        if stopped:
+            stopped.set()
+
+
+def _receive(close_event: Event, sub_handlers):
     while not close_event.is_set():
         try:
-            record = QLogM.receive()
-            sub_handler.emit(record)
+            for item in QLogM.receive_batch():
+                _dispatch_item(item, sub_handlers)
         except (KeyboardInterrupt, SystemExit):
             raise
         except (EOFError, OSError):
@@ -39,24 +115,60 @@ def _send(s):
 
 
 class MultiProcessingHandler(logging.Handler):
-    def __init__(self, name, sub_handler):
+    """
+    所有writer共用一个handler，日志只入队一次，由一个receive线程分发到各writer的sub_handler
+    emit先攒批，满batch_size条或等待flush_interval秒后整批入队，减少pickle和管道写入次数
+    """
+
+    def __init__(self, name, sub_handlers: list, batch_size: int = _BatchSize,
+                 flush_interval: float = _FlushInterval):
         super().__init__()
 
-        if sub_handler is None:
-            sub_handler = logging.StreamHandler()
-        self.sub_handler = sub_handler
+        if not sub_handlers:
+            sub_handlers = [logging.StreamHandler()]
+        self.sub_handlers = sub_handlers
+
+        self.setLevel(min(sub_handler.level for sub_handler in self.sub_handlers))
+        # 仅用于格式化exc_info，各writer的格式在sub_handler中
+        self.setFormatter(logging.Formatter())
+        # 各writer格式化用到的字段，只传输这些
+        self._fields = wire_fields(self.sub_handlers)
 
-        self.setLevel(self.sub_handler.level)
-        self.setFormatter(self.sub_handler.formatter)
-        self.filters = self.sub_handler.filters
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buf = []
+        self._pending = Event()  # _buf非空
+        self._send_lock = Lock()  # 发送时持有，不持有self.lock，避免阻塞emit
+        self._flusher_pid = 0
 
         self._is_closed = Event()
+        self._receiving = Event()
+        self._received = Event()
         from common_tool.server import MultiM
-        MultiM.add_t(name, receive, self._is_closed, self.sub_handler)
-
-    def setFormatter(self, fmt):
-        super().setFormatter(fmt)
-        self.sub_handler.setFormatter(fmt)
+        MultiM.add_t(name, receive, self._is_closed, self.sub_handlers, self._receiving, self._received)
+
+        _set_current(self)
+
+    def _after_fork(self):
+        self._buf = []
+        self._pending = Event()
+        self._send_lock = Lock()
+        self._flusher_pid = 0
+
+    def _start_flusher(self):
+        if self._flusher_pid == os.getpid():
+            return
+        self._flusher_pid = os.getpid()
+        t = Thread(target=self._flush_loop, name="mp-handler-flusher")
+        t.daemon = True
+        t.start()
+
+    def _flush_loop(self):
+        while not self._is_closed.is_set():
+            self._pending.wait()
+            # 攒批
+            time.sleep(self._flush_interval)
+            self.flush()
 
     def _format_record(self, record):
         # ensure that exc_info and args
@@ -70,19 +182,46 @@ class MultiProcessingHandler(logging.Handler):
             self.format(record)
             record.exc_info = None
 
-        return record
+        return encode(record, self._fields)
 
     def emit(self, record):
+        # 调用方handle已持有self.lock
         try:
-            s = self._format_record(record)
-            _send(s)
+            self._buf.append(self._format_record(record))
+            if len(self._buf) >= self._batch_size:
+                self.flush()
+            elif len(self._buf) == 1:
+                self._start_flusher()
+                self._pending.set()
         except (KeyboardInterrupt, SystemExit):
             raise
         except:
             self.handleError(record)
 
+    def flush(self):
+        self.acquire()
+        try:
+            batch = self._buf
+            self._buf = []
+            self._pending.clear()
+        finally:
+            self.release()
+        # 其他线程正在发送时等它完成，退出前的flush返回时已全部发送，
+        # 否则flusher线程在put中等待空间时进程退出，这一批会丢失
+        with self._send_lock:
+            if batch:
+                _send((self._fields, batch))
+
     def close(self):
         if not self._is_closed.is_set():
+            self.flush()
+            if _current is self:
+                _set_current(None)
             self._is_closed.set()
-            self.sub_handler.close()
+            self._pending.set()
+            # 等receive线程处理完队列中的日志再关闭writer
+            if self._receiving.is_set():
+                self._received.wait(1)
+            for sub_handler in self.sub_handlers:
+                sub_handler.close()
             super().close()
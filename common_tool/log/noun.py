@@ -17,8 +17,20 @@ _DefaultLevel = "info"
 _DefaultFmt = "[%(asctime)s][%(levelname)s][%(filename)s:%(lineno)s][%(process)d][%(message)s]"
 _DefaultTimeFmt = "%Y-%m-%d %H:%M:%S"
 _DefaultFileName = "info.log"
+# json writer默认单独的文件，与file writer同时配置时不写入同一文件
+_DefaultJsonFileName = "info.json.log"
 _DefaultLogPath = "log"
 
+# 日志队列，maxsize为最多积压的批数，每批最多64条
+_DefaultQueueMaxSize = 10000
+_DefaultQueuePolicy = "block"
+_DefaultQueueTimeout = 1
+_DefaultQueueSample = 10
+_DefaultRingSize = 16 * 1024 * 1024
+
+# 调用点限流，每隔多少秒输出被限流的条数
+_DefaultLimitReport = 60
+
 LevelNames = {
     "trace": LogLevel.LevelTrace,
     "debug": LogLevel.LevelDebug,
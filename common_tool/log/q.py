@@ -1,28 +1,190 @@
-from multiprocessing import Queue
+import logging
+from multiprocessing import Queue, Array
+from queue import Empty, Full
 from threading import Event
 
+from .conf import QueueConfig
+from .noun import _DefaultQueueMaxSize, _DefaultQueuePolicy, _DefaultQueueTimeout, _DefaultQueueSample
+
+# 队列满时等待timeout秒，仍满则丢弃
+PolicyBlock = "block"
+# 队列积压过半时丢弃DEBUG，满时丢弃
+PolicyDropDebug = "drop_debug"
+# 队列积压过半时WARNING以下每sample条保留1条，满时丢弃
+PolicySample = "sample"
+Policies = (PolicyBlock, PolicyDropDebug, PolicySample)
+# 丢弃计数按级别分组，下标为levelno // 10，NOTSET到CRITICAL及以上
+_DropLevels = 6
+
 
 class _QLogM:
     def __init__(self):
         super().__init__()
-        self._log_q: Queue = Queue()
+        self._maxsize = _DefaultQueueMaxSize
+        self._log_q: Queue = Queue(self._maxsize)
         self._log_q_stop = Event()
+        self._policy = _DefaultQueuePolicy
+        self._timeout = _DefaultQueueTimeout
+        self._sample = _DefaultQueueSample
+        self._sample_i = 0
+        # 所有进程丢弃的日志条数，按级别，与队列一起传给子进程
+        self._drops = Array("q", _DropLevels)
         self.start_log()
 
     @property
     def log_q(self):
         return self._log_q
 
+    @property
+    def drops(self):
+        return self._drops
+
     def init_q(self, q: Queue):
         self._log_q = q
 
+    def init_conf(self, conf: QueueConfig, log_q=None, drops=None):
+        """
+        :param conf: 配置文件中的log_queue
+        :param log_q: 子进程传入父进程的队列，为空时按配置创建
+        :param drops: 子进程传入父进程的丢弃计数，见drops
+        """
+        if drops is not None:
+            self._drops = drops
+        if conf.policy not in Policies:
+            print(f"QLogM policy {conf.policy} not in {Policies}, use {self._policy}")
+        else:
+            self._policy = conf.policy
+        self._timeout = conf.timeout
+        self._sample = max(conf.sample, 1)
+        if log_q:
+            self.init_q(log_q)
+        elif conf.transport == "ring":
+            if "policy" in conf:
+                print(f"QLogM policy {conf.policy} not used by ring transport, use overflow {conf.overflow}")
+            self.use_ring(conf.ring_size, conf.overflow, conf.timeout)
+        elif conf.maxsize != self._maxsize:
+            self._replace(Queue(conf.maxsize))
+        self._maxsize = conf.maxsize
+
+    def _replace(self, q):
+        old = self._log_q
+        self._log_q = q
+        # 已入队的日志转入新队列
+        try:
+            while True:
+                self._log_q.put_nowait(old.get_nowait())
+        except (Empty, Full):
+            pass
+        old.close()
+
+    def use_ring(self, size: int = 16 * 1024 * 1024, overflow: str = "block", timeout: float = 1):
+        """
+        改用共享内存环形缓冲区传输日志，适合日志量很大的多进程，见LogRing
+        需在父进程、启动子进程前调用
+        :param size: 缓冲区字节数
+        :param overflow: 满时的处理，block、drop_oldest、drop_newest
+        :param timeout: block时最多等待的秒数，超过后丢弃
+        """
+        from .ring import LogRing
+        self._replace(LogRing(size, overflow, timeout))
+        # 满时的处理由overflow决定，log中总是调用put，put_nowait不等待空间
+        self._policy = PolicyBlock
+        self._timeout = timeout
+
+    def dropped(self) -> int:
+        """
+        丢弃的日志条数，所有进程按policy丢弃的，加上环形缓冲区所有进程溢出丢弃的
+        """
+        return sum(self._drops[:]) + getattr(self._log_q, "dropped", lambda: 0)()
+
+    def drop_stats(self) -> dict:
+        """
+        所有进程按policy丢弃的日志条数，按级别
+        """
+        return {logging.getLevelName(i * 10): n for i, n in enumerate(self._drops[:]) if n}
+
     def receive(self):
         return self._log_q.get(timeout=0.2)
 
+    def receive_nowait(self):
+        return self._log_q.get_nowait()
+
+    def receive_batch(self, max_n: int = 256) -> list:
+        """
+        阻塞等待第一条，之后不等待，最多取max_n条
+        """
+        batch = [self._log_q.get(timeout=0.2)]
+        try:
+            while len(batch) < max_n:
+                batch.append(self._log_q.get_nowait())
+        except Empty:
+            pass
+        return batch
+
+    def _busy(self) -> bool:
+        # 积压过半，macOS不支持qsize
+        if not self._maxsize:
+            return False
+        try:
+            return self._log_q.qsize() * 2 >= self._maxsize
+        except (NotImplementedError, AttributeError):
+            return False
+
+    def _drop(self, rows: list):
+        self._add_drops([row[0] for row in rows])
+
+    def _add_drops(self, levels: list):
+        """
+        一次加锁累加一批丢弃的级别
+        """
+        if not levels:
+            return
+        n = [0] * _DropLevels
+        for levelno in levels:
+            n[min(levelno // 10, _DropLevels - 1)] += 1
+        with self._drops.get_lock():
+            for i, c in enumerate(n):
+                if c:
+                    self._drops[i] += c
+
+    def _shed(self, rows: list) -> list:
+        """
+        积压时按策略丢弃部分日志，row[0]为级别，见wire
+        """
+        keep = []
+        dropped = []
+        for row in rows:
+            if self._policy == PolicyDropDebug:
+                ok = row[0] > logging.DEBUG
+            elif row[0] >= logging.WARNING:
+                ok = True
+            else:
+                self._sample_i += 1
+                ok = self._sample_i % self._sample == 0
+            if ok:
+                keep.append(row)
+            else:
+                dropped.append(row[0])
+        self._add_drops(dropped)
+        return keep
+
     def log(self, s):
-        self._log_q_stop.wait()
+        if not self._log_q_stop.is_set():
+            self._log_q_stop.wait()
+        fields, rows = s
         try:
+            if self._policy == PolicyBlock:
+                self._log_q.put(s, timeout=self._timeout)
+                return
+            if self._busy():
+                rows = self._shed(rows)
+                if not rows:
+                    return
+                s = (fields, rows)
             self._log_q.put_nowait(s)
+        except Full:
+            # 日志写不过来时丢弃，不阻塞业务
+            self._drop(rows)
         except ValueError:
             print(f"QLogM q is closed")
 
@@ -37,6 +199,9 @@ class _QLogM:
         return self._log_q.empty()
 
     def close(self):
+        drop_stats = self.drop_stats()
+        if drop_stats:
+            print(f"QLogM dropped {drop_stats}")
         self._log_q.close()
         self._log_q.join_thread()
         print("QLogM closed")
@@ -0,0 +1,199 @@
+import os
+import pickle
+import struct
+from collections import deque
+from multiprocessing import Lock, Value
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from time import monotonic, sleep
+
+# head, tail, dropped，head、tail为累计写入、读取的字节数
+_Header = struct.Struct("<QQQ")
+# 数据长度, 包含的日志条数
+_Frame = struct.Struct("<II")
+
+# 满时等待空间，超过timeout仍无空间则丢弃
+OverflowBlock = "block"
+# 满时丢弃最早的日志
+OverflowDropOldest = "drop_oldest"
+# 满时丢弃新写入的日志
+OverflowDropNewest = "drop_newest"
+Overflows = (OverflowBlock, OverflowDropOldest, OverflowDropNewest)
+
+# 无数据时读取方轮询间隔
+_PollInterval = 0.002
+# 等待进程锁的秒数，持锁进程中途退出时锁不会释放，超时后写入方丢弃、读取方视为无数据
+_LockTimeout = 0.5
+
+
+def _records(obj) -> int:
+    # 一项为一批日志(fields, rows)，见wire
+    if isinstance(obj, tuple) and len(obj) == 2 and isinstance(obj[1], list):
+        return len(obj[1])
+    return 1
+
+
+class LogRing:
+    """
+    基于共享内存的环形缓冲区，替代QLogM中的multiprocessing.Queue，见QLogM.use_ring
+    多个进程写入，写入时持有进程锁直接拷贝到共享内存，不经过管道和feeder线程
+    父进程的日志线程读取，一次取出已写入的全部数据
+    接口与Queue一致：put、put_nowait、get、get_nowait、empty、close、join_thread；满时不抛出Full，丢弃的条数见dropped
+    需在父进程创建，子进程通过继承获得
+    """
+
+    def __init__(self, size: int = 16 * 1024 * 1024, overflow: str = OverflowBlock, timeout: float = 1):
+        """
+        :param size: 缓冲区字节数
+        :param overflow: 满时的处理，block、drop_oldest、drop_newest，丢弃的条数见dropped
+        :param timeout: block时put默认最多等待的秒数
+        """
+        if overflow not in Overflows:
+            raise ValueError(f"LogRing overflow {overflow} not in {Overflows}")
+        self._size = size
+        self._overflow = overflow
+        self._timeout = timeout
+        self._shm = SharedMemory(create=True, size=_Header.size + size)
+        self._lock = Lock()
+        self._lost = Value("Q", 0)  # 拿不到锁丢弃的条数，不能写入header
+        self._owner_pid = os.getpid()  # 仅创建进程负责释放共享内存
+        self._closed = False
+        self._dropped = 0  # 关闭后保留丢弃数
+        self._out = deque()  # 读取方已取出、未消费的
+        _Header.pack_into(self._shm.buf, 0, 0, 0, 0)
+
+    def _header(self) -> tuple:
+        return _Header.unpack_from(self._shm.buf, 0)
+
+    def _write(self, pos: int, b: bytes):
+        buf = self._shm.buf
+        off = pos % self._size
+        first = min(len(b), self._size - off)
+        buf[_Header.size + off:_Header.size + off + first] = b[:first]
+        if first < len(b):
+            buf[_Header.size:_Header.size + len(b) - first] = b[first:]
+
+    def _read(self, pos: int, n: int) -> bytes:
+        buf = self._shm.buf
+        off = pos % self._size
+        first = min(n, self._size - off)
+        b = bytes(buf[_Header.size + off:_Header.size + off + first])
+        if first < n:
+            b += bytes(buf[_Header.size:_Header.size + n - first])
+        return b
+
+    def _drop_oldest(self, head: int, tail: int, need: int) -> tuple[int, int]:
+        # 调用方持有锁，按整帧丢弃直到空间足够
+        dropped = 0
+        while self._size - (head - tail) < need:
+            length, n = _Frame.unpack(self._read(tail, _Frame.size))
+            tail += _Frame.size + length
+            dropped += n
+        return tail, dropped
+
+    def put(self, obj, block: bool = True, timeout: float = None):
+        """
+        空间不足时按overflow处理
+        :param block: overflow为block时是否等待空间，不等待时直接丢弃
+        :param timeout: 等待空间的秒数，None时为创建时的timeout，超过后丢弃
+        """
+        if self._closed:
+            raise ValueError("LogRing is closed")
+        data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        n = _records(obj)
+        need = _Frame.size + len(data)
+        deadline = monotonic() + (self._timeout if timeout is None else timeout)
+        while True:
+            if not self._lock.acquire(timeout=_LockTimeout):
+                with self._lost.get_lock():
+                    self._lost.value += n
+                return
+            try:
+                head, tail, dropped = self._header()
+                if need > self._size or (
+                        need > self._size - (head - tail) and self._overflow == OverflowDropNewest):
+                    _Header.pack_into(self._shm.buf, 0, head, tail, dropped + n)
+                    return
+                if need > self._size - (head - tail) and self._overflow == OverflowDropOldest:
+                    tail, more = self._drop_oldest(head, tail, need)
+                    dropped += more
+                if need <= self._size - (head - tail):
+                    self._write(head, _Frame.pack(len(data), n) + data)
+                    # 先写数据再更新head，读取方看到head时数据已完整
+                    _Header.pack_into(self._shm.buf, 0, head + need, tail, dropped)
+                    return
+                if not block or monotonic() >= deadline:
+                    _Header.pack_into(self._shm.buf, 0, head, tail, dropped + n)
+                    return
+            finally:
+                self._lock.release()
+            sleep(_PollInterval)
+
+    def put_nowait(self, obj):
+        self.put(obj, block=False)
+
+    def _take(self):
+        # 一次取出全部已写入的，释放锁后再反序列化
+        # 先不加锁判断是否为空，空闲时不与写入方争锁
+        head, tail, _ = self._header()
+        if head == tail:
+            return
+        if not self._lock.acquire(timeout=_LockTimeout):
+            return
+        try:
+            head, tail, dropped = self._header()
+            if head == tail:
+                return
+            b = self._read(tail, head - tail)
+            _Header.pack_into(self._shm.buf, 0, head, head, dropped)
+        finally:
+            self._lock.release()
+        off = 0
+        while off < len(b):
+            length, _ = _Frame.unpack_from(b, off)
+            off += _Frame.size
+            self._out.append(pickle.loads(b[off:off + length]))
+            off += length
+
+    def get_nowait(self):
+        if not self._out:
+            self._take()
+            if not self._out:
+                raise Empty
+        return self._out.popleft()
+
+    def get(self, timeout: float = None):
+        deadline = None if timeout is None else monotonic() + timeout
+        while True:
+            try:
+                return self.get_nowait()
+            except Empty:
+                if deadline is not None and monotonic() >= deadline:
+                    raise
+            sleep(_PollInterval)
+
+    def empty(self) -> bool:
+        if self._closed:
+            return not self._out
+        head, tail, _ = self._header()
+        return head == tail and not self._out
+
+    def dropped(self) -> int:
+        """
+        溢出或拿不到锁丢弃的日志条数，所有进程累计
+        """
+        if self._closed:
+            return self._dropped
+        return self._header()[2] + self._lost.value
+
+    def close(self):
+        if self._closed:
+            return
+        self._dropped = self.dropped()
+        self._closed = True
+        self._shm.close()
+        if self._owner_pid == os.getpid():
+            self._shm.unlink()
+
+    def join_thread(self):
+        pass
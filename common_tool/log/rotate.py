@@ -0,0 +1,115 @@
+import gzip
+import os
+import shutil
+from logging.handlers import TimedRotatingFileHandler
+from queue import Queue
+from threading import Thread
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CompressGzip = "gzip"
+CompressZstd = "zstd"
+_Suffix = {CompressGzip: ".gz", CompressZstd: ".zst"}
+
+
+def _compress_file(src: str, method: str):
+    """
+    先写入隐藏的临时文件再改名，压缩中的文件不计入备份数
+    """
+    dst = src + _Suffix[method]
+    dirname, basename = os.path.split(dst)
+    tmp = os.path.join(dirname, f".{basename}.tmp")
+    with open(src, "rb") as f_in:
+        if method == CompressZstd:
+            with open(tmp, "wb") as f_out:
+                zstandard.ZstdCompressor().copy_stream(f_in, f_out)
+        else:
+            with gzip.open(tmp, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    os.replace(tmp, dst)
+    os.remove(src)
+
+
+class _Compressor:
+    """
+    后台压缩线程，所有handler共用，不阻塞日志receive线程
+    """
+
+    def __init__(self):
+        self._q = Queue()
+        self._pid = 0
+
+    def _start(self):
+        # fork后需在子进程重新启动
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        t = Thread(target=self._loop, name="log-compressor")
+        t.daemon = True
+        t.start()
+
+    def _loop(self):
+        while True:
+            src, method = self._q.get()
+            try:
+                _compress_file(src, method)
+            except OSError as e:
+                print(f"log compress {src} err={e}")
+            finally:
+                self._q.task_done()
+
+    def submit(self, src: str, method: str):
+        self._start()
+        self._q.put((src, method))
+
+
+_CompressorM = _Compressor()
+
+
+class CompressRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    轮转后在后台压缩为.gz或.zst，backupCount计入压缩后的文件
+    轮转本身只改名，压缩完成前保留未压缩的文件，同样计入backupCount
+    """
+
+    def __init__(self, filename, compress: str = CompressGzip, **kwargs):
+        """
+        :param compress: gzip或zstd，zstd需安装zstandard，未安装时使用gzip
+        """
+        super().__init__(filename, **kwargs)
+        if compress == CompressZstd and zstandard is None:
+            print("log compress zstd need zstandard, use gzip")
+            compress = CompressGzip
+        if compress not in _Suffix:
+            print(f"log compress {compress} not in {list(_Suffix)}, use gzip")
+            compress = CompressGzip
+        self._compress = compress
+        self.rotator = self._rotate
+
+    def _rotate(self, source: str, dest: str):
+        if not os.path.exists(source):
+            return
+        os.rename(source, dest)
+        _CompressorM.submit(dest, self._compress)
+
+    def getFilesToDelete(self):
+        # 同一时间后缀的压缩文件和未压缩文件算作一个备份
+        dirname, basename = os.path.split(self.baseFilename)
+        backups: dict[str, list] = {}
+        for name in os.listdir(dirname):
+            if not name.startswith(basename + "."):
+                continue
+            stem, ext = os.path.splitext(name)
+            if ext not in _Suffix.values():
+                stem = name
+            if self.extMatch.match(stem[len(basename) + 1:]):
+                backups.setdefault(stem, []).append(os.path.join(dirname, name))
+        if len(backups) <= self.backupCount:
+            return []
+        result = []
+        for stem in sorted(backups)[:len(backups) - self.backupCount]:
+            result.extend(backups[stem])
+        return result
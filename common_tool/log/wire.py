@@ -0,0 +1,61 @@
+import logging
+import re
+
+"""
+进程间传输日志时，不pickle整个LogRecord，只传格式化需要的字段
+一批日志为(fields, rows)，rows中每条为tuple：
+    (levelno, created, msg, exc_text, stack_info, *fields对应的值)
+"""
+
+# 由固定字段还原，不需要单独传输
+_RebuiltFields = {
+    "asctime", "message", "levelname", "levelno", "created", "msecs",
+    "msg", "args", "exc_info", "exc_text", "stack_info",
+}
+_FieldReg = re.compile(r"%\((\w+)\)")
+_FixedLen = 5
+
+
+def formatter_fields(formatter) -> set:
+    """
+    formatter用到的LogRecord字段，自定义formatter可通过fields属性声明
+    """
+    if formatter is None:
+        return set()
+    fields = getattr(formatter, "fields", None)
+    if fields is not None:
+        return set(fields)
+    return set(_FieldReg.findall(getattr(formatter, "_fmt", None) or ""))
+
+
+def wire_fields(handlers: list) -> tuple:
+    fields = set()
+    for handler in handlers:
+        fields |= formatter_fields(handler.formatter)
+    return tuple(sorted(fields - _RebuiltFields))
+
+
+def encode(record: logging.LogRecord, fields: tuple) -> tuple:
+    """
+    调用方需先将msg % args、exc_info格式化
+    """
+    return (record.levelno, record.created, record.msg, record.exc_text, record.stack_info,
+            *[getattr(record, field, None) for field in fields])
+
+
+def decode(fields: tuple, row: tuple) -> logging.LogRecord:
+    # 不调用LogRecord.__init__，直接填充字段
+    record = logging.LogRecord.__new__(logging.LogRecord)
+    d = record.__dict__
+    d.update(zip(fields, row[_FixedLen:]))
+    levelno, created, msg, exc_text, stack_info = row[:_FixedLen]
+    d["levelno"] = levelno
+    d["levelname"] = logging.getLevelName(levelno)
+    d["created"] = created
+    d["msecs"] = int((created - int(created)) * 1000) + 0.0
+    d["msg"] = msg
+    d["args"] = None
+    d["exc_info"] = None
+    d["exc_text"] = exc_text
+    d["stack_info"] = stack_info
+    return record
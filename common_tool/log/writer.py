@@ -3,6 +3,8 @@ import os.path
 from logging.handlers import TimedRotatingFileHandler
 
 from .conf import OutputConfig
+from .formatter import CachedFormatter, JsonFormatter
+from .rotate import CompressRotatingFileHandler
 from .noun import LevelNames, LevelToLoggingLevel
 from common_tool.config import get_running_conf
 
@@ -12,7 +14,7 @@ class BaseWriter:
         self.name = "Base"
         self.output_config = conf
         self.level = LevelToLoggingLevel.get(LevelNames[conf.level], None)
-        self.format_str = logging.Formatter(fmt=conf.fmt, datefmt=conf.time_fmt)
+        self.format_str = CachedFormatter(fmt=conf.fmt, datefmt=conf.time_fmt)
         self.handler = None
 
 
@@ -39,13 +41,31 @@ class FileWriter(BaseWriter):
         super().__init__(conf)
         self.name = "File"
         filename = f"{get_running_conf().log_f_prefix}{conf.filename}"
-        self.handler = TimedRotatingFileHandler(
+        if conf.direct:
+            # 每个进程单独的文件
+            filename = f"{get_running_conf().log_f_prefix}{os.getpid()}.{conf.filename}"
+        kwargs = dict(
             filename=os.path.join(conf.log_path, filename),
             when=conf.max_age, interval=1,
             backupCount=conf.max_backups, encoding="utf-8",
             # dont open log now
             delay=True,
         )
+        if conf.compress:
+            # 轮转后的文件在后台压缩
+            self.handler = CompressRotatingFileHandler(compress=conf.compress, **kwargs)
+        else:
+            self.handler = TimedRotatingFileHandler(**kwargs)
         self.handler.setLevel(self.level)
         self.handler.name = self.name
         self.handler.setFormatter(self.format_str)
+
+
+class JsonWriter(FileWriter):
+    # 每条日志一行json，供日志采集直接解析，见JsonFormatter
+    def __init__(self, conf: OutputConfig):
+        super().__init__(conf)
+        self.name = "Json"
+        self.format_str = JsonFormatter(datefmt=conf.time_fmt)
+        self.handler.name = self.name
+        self.handler.setFormatter(self.format_str)
@@ -1,4 +1,4 @@
 from .server import init_base
 from .ctx import Context, timeoutd
 from .mp import MultiM, Task, GracefulKiller, ErrGracefulKiller
-from .sync import QM, SemM, LockM, RLockM, CounterM
+from .sync import QM, SemM, LockM, RLockM, CounterM, ShmM, BusM
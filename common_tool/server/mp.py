@@ -11,7 +11,7 @@ import copy
 from common_tool.log import logger
 from common_tool.system import is_linux, cur_pid
 from common_tool.call import call_async
-from .sync import QM, SemM, RLockM, LockM, CounterM
+from .sync import QM, SemM, RLockM, LockM, CounterM, ShmM, BusM
 from .server import init_log, init_sync
 
 
@@ -26,6 +26,8 @@ class TaskParam:
     _sep_lock = "_+_utils_lock_q_+_"
     _sep_rlock = "_+_utils_rlock_q_+_"
     _sep_counter = "_+_utils_counter_+_"
+    _sep_shm = "_+_utils_shm_+_"
+    _sep_bus = "_+_utils_bus_+_"
 
     @classmethod
     def extend(cls, task) -> tuple[list, dict]:
@@ -48,6 +50,7 @@ class TaskParam:
 
         args.append(cls._sep_log_q)
         args.append(QLogM.log_q)
+        args.append(QLogM.drops)
 
         args.append(cls._sep_q)
         args.extend(QM.list())
@@ -64,6 +67,12 @@ class TaskParam:
         args.append(cls._sep_counter)
         args.extend(CounterM.list())
 
+        args.append(cls._sep_shm)
+        args.extend(ShmM.list())
+
+        args.append(cls._sep_bus)
+        args.extend(BusM.list())
+
         logger.debug(f"{args} {kwargs}")
         return args, kwargs
 
@@ -88,11 +97,14 @@ class TaskParam:
 
         ind = args.index(cls._sep_log_q)
         log_q = args[ind + 1]
+        log_drops = args[ind + 2]
 
-        sync = args[ind + 2:]
+        sync = args[ind + 3:]
         args = args[:ind]
 
         # 按照append顺序倒序
+        buses, sync = cls._parse_args_sep(cls._sep_bus, sync)
+        shms, sync = cls._parse_args_sep(cls._sep_shm, sync)
         counters, sync = cls._parse_args_sep(cls._sep_counter, sync)
         rlocks, sync = cls._parse_args_sep(cls._sep_rlock, sync)
         locks, sync = cls._parse_args_sep(cls._sep_lock, sync)
@@ -110,7 +122,7 @@ class TaskParam:
         #     queues = sync[ind + 1:]
         #     sync = sync[:ind]
 
-        return args, kwargs, log_q, init, end, global_conf, qs, sems, locks, rlocks, counters
+        return args, kwargs, log_q, log_drops, init, end, global_conf, qs, sems, locks, rlocks, counters, shms, buses
 
 
 class MpDecorator:
@@ -123,9 +135,10 @@ class MpDecorator:
         if self.grace:
             GracefulKiller(exit_now=True)
 
-        args, kwargs, log_q, init, end, global_conf, qs, sems, locks, rlocks, counters = TaskParam.parse(args, kwargs)
-        init_log(global_conf=global_conf, log_q=log_q)
-        init_sync(qs, sems, locks, rlocks, counters)
+        args, kwargs, log_q, log_drops, init, end, global_conf, qs, sems, locks, rlocks, counters, shms, buses = \
+            TaskParam.parse(args, kwargs)
+        init_log(global_conf=global_conf, log_q=log_q, log_drops=log_drops)
+        init_sync(qs, sems, locks, rlocks, counters, shms, buses)
 
         result = None
         if init:
@@ -296,6 +309,8 @@ class _MultiM:
         log.close()
         self._wait_t_done()
         QM.close()
+        ShmM.close()
+        BusM.close()
 
         print("MultiM start end")
 
@@ -7,7 +7,7 @@ def init_base(conf_path: str = None, log=None, qs=None, global_conf=None, log_f_
     return OK
 
 
-def init_log(conf_path: str = None, global_conf=None, log_q=None, log_f_prefix: str = ""):
+def init_log(conf_path: str = None, global_conf=None, log_q=None, log_f_prefix: str = "", log_drops=None):
     from common_tool.log import logger
     if global_conf:
         from common_tool.config import init_global_conf
@@ -20,15 +20,15 @@ def init_log(conf_path: str = None, global_conf=None, log_q=None, log_f_prefix:
             return err
 
     from common_tool.log.q import QLogM
-    if log_q:
-        QLogM.init_q(log_q)
+    from common_tool.log.conf import QueueConfig
     from common_tool.log.log import init
-    from common_tool.config import log_conf
+    from common_tool.config import log_conf, log_queue_conf
+    QLogM.init_conf(QueueConfig(log_queue_conf()), log_q, log_drops)
     init(log_conf())
 
 
-def init_sync(qs=None, sems=None, locks=None, rlocks=None, counters=None):
-    from .sync import QM, SemM, LockM, RLockM, CounterM
+def init_sync(qs=None, sems=None, locks=None, rlocks=None, counters=None, shms=None, buses=None):
+    from .sync import QM, SemM, LockM, RLockM, CounterM, ShmM, BusM
     if qs:
         QM.init_by_list(qs)
 
@@ -43,3 +43,9 @@ def init_sync(qs=None, sems=None, locks=None, rlocks=None, counters=None):
 
     if counters:
         CounterM.init_by_list(counters)
+
+    if shms:
+        ShmM.init_by_list(shms)
+
+    if buses:
+        BusM.init_by_list(buses)
@@ -4,6 +4,7 @@ from multiprocessing import Semaphore, Queue, RLock, Lock, Value
 from queue import Empty
 from typing import Any, Callable
 
+from common_tool.data.shm import ShmTable, InvalidBus
 from common_tool.log import logger
 from common_tool.server import Context
 from common_tool.system import DEFAULT_TIMEOUT
@@ -147,8 +148,48 @@ class _QM(SyncBase):
         print("QM closed")
 
 
+class _ShmM(SyncBase):
+    """
+    跨进程共享的缓存表，需在MultiM.start前注册
+    """
+    def register(self, name: str, size: int = 64 * 1024 * 1024, slots: int = 64 * 1024):
+        if name in self._data:
+            logger.error(f"SyncBase has {name}, will ignore")
+            return
+        super().register(name, ShmTable(size, slots))
+
+    def get(self, name: str) -> ShmTable:
+        return self._get_item(name)
+
+    def close(self):
+        for name, table in self._data.items():
+            table.close()
+        print("ShmM closed")
+
+
+class _BusM(SyncBase):
+    """
+    跨进程缓存失效广播，需在MultiM.start前注册，见CacheKey的bus参数
+    """
+    def register(self, name: str, slots: int = 4096):
+        if name in self._data:
+            logger.error(f"SyncBase has {name}, will ignore")
+            return
+        super().register(name, InvalidBus(slots))
+
+    def get(self, name: str) -> InvalidBus:
+        return self._get_item(name)
+
+    def close(self):
+        for name, bus in self._data.items():
+            bus.close()
+        print("BusM closed")
+
+
 SemM = _SemM()
 QM = _QM()
 LockM = _LockM()
 RLockM = _RLockM()
 CounterM = _CounterM()
+ShmM = _ShmM()
+BusM = _BusM()